@@ -1,10 +1,16 @@
 
-import tkinter as tk
+import os
+import time
 
 import click
 
+from neverd import __version__
 
+
+# commands import what they need when run, so that --help, --version and
+# headless commands do not load tkinter, PIL or numpy needlessly
 @click.group()
+@click.version_option(version=__version__)
 def main_cli():
     pass
 
@@ -12,6 +18,8 @@ def main_cli():
 @click.command()
 @click.option("--filename", '-f', nargs=1, type=str, default=None)
 def gui(filename):
+    import tkinter as tk
+
     from neverd.helpers import load_from_json
     from neverd.helpers import load_from_dict
     from neverd.app import App
@@ -28,4 +36,54 @@ def gui(filename):
     tk.mainloop()
 
 
+@click.command()
+@click.option("--filename", '-f', nargs=1, type=str, required=True)
+@click.option("--output", '-o', nargs=1, type=str, default=None)
+def export(filename, output):
+    # real coordinates of the project objects, without tkinter (headless)
+    from neverd.export import export_file
+
+    if output is None:
+        output = f'{os.path.splitext(filename)[0]}.csv'
+
+    export_file(filename, output)
+
+
+@click.command()
+@click.argument("paths", nargs=-1, type=str, required=True)
+@click.option("--output-dir", '-o', nargs=1, type=str, default=None)
+@click.option("--format", "export_format", type=click.Choice(['csv', 'npy']),
+              default='csv')
+@click.option("--jobs", '-j', nargs=1, type=int, default=None)
+@click.option("--n-points", nargs=1, type=int, default=None)
+def batch(paths, output_dir, export_format, jobs, n_points):
+    # exports many projects (files or directories) in parallel
+    from neverd.export import get_project_filenames
+    from neverd.export import iter_export_files
+
+    filenames = get_project_filenames(paths)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    start_time = time.perf_counter()
+    n_failed = n_rows = 0
+    for filename, _, file_n_rows, error in iter_export_files(
+            filenames, output_dir=output_dir, extension=f'.{export_format}',
+            n_points=n_points, n_jobs=jobs):
+        if error is not None:
+            n_failed += 1
+            click.echo(f'{filename}: {error}', err=True)
+
+        n_rows += file_n_rows
+
+    elapsed = time.perf_counter() - start_time
+    click.echo(f'{len(filenames) - n_failed} exported, {n_failed} failed, '
+               f'{n_rows} points in {elapsed:.2f} s')
+
+    if n_failed:
+        raise SystemExit(1)
+
+
 main_cli.add_command(gui)
+main_cli.add_command(export)
+main_cli.add_command(batch)
@@ -1,5 +1,10 @@
+import platform
 
 
 ICON_NAMES = {
     'load': 'load_icon.gif',
 }
+
+# macOS swaps the right and middle mouse buttons
+RIGHT_BUTTON = 2 if platform.system() == 'Darwin' else 3
+MIDDLE_BUTTON = 3 if platform.system() == 'Darwin' else 2
@@ -0,0 +1,143 @@
+import csv
+import glob
+import os
+
+import numpy as np
+
+from neverd.model import load_document
+from neverd.storage import load_data
+
+
+EXPORT_FIELDS = ('name', 'type', 'index', 'x', 'y')
+PROJECT_EXTENSIONS = ('.json', '.npz')
+
+
+def export_file(filename, output, n_points=None):
+    # project (json or .npz) to .csv or .npy, by extension
+    return export_data(load_data(filename), output, n_points=n_points)
+
+
+def export_data(data, output, n_points=None):
+    # n_points overrides the number of samples of every slider
+    if n_points is not None:
+        for obj_info in data.get('objects', []):
+            if obj_info.get('type') == 'Slider':
+                obj_info['n_points'] = n_points
+
+    table = get_export_table(load_document(data))
+
+    if os.path.splitext(output)[1].lower() == '.npy':
+        np.save(output, table)
+    else:
+        write_csv(table, output)
+
+    return len(table)
+
+
+def get_export_table(document):
+    # one row per point (points, line points and slider samples) with the
+    # object name, type, point index and real coordinates
+    models = list(document.objects)
+    coords = [model.coords.reshape(-1, 2) for model in models]
+    n_points = [len(model_coords) for model_coords in coords]
+
+    name_len = max([len(model.name) for model in models], default=1)
+    type_len = max([len(model.type) for model in models], default=1)
+    table = np.empty(sum(n_points),
+                     dtype=[('name', f'U{name_len}'), ('type', f'U{type_len}'),
+                            ('index', int), ('x', float), ('y', float)])
+
+    if models:
+        table['name'] = np.repeat([model.name for model in models], n_points)
+        table['type'] = np.repeat([model.type for model in models], n_points)
+        table['index'] = np.concatenate([np.arange(n) for n in n_points])
+
+        coords = np.concatenate(coords)
+        table['x'] = coords[:, 0]
+        table['y'] = coords[:, 1]
+
+    return table
+
+
+def write_csv(table, filename):
+    with open(filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_FIELDS)
+        writer.writerows(zip(*[table[field].tolist()
+                               for field in EXPORT_FIELDS]))
+
+
+def get_project_filenames(paths):
+    # directories are replaced by the project files they contain
+    filenames = []
+    for path in paths:
+        if not os.path.isdir(path):
+            filenames.append(path)
+            continue
+
+        for extension in PROJECT_EXTENSIONS:
+            filenames.extend(
+                sorted(glob.glob(os.path.join(path, f'*{extension}'))))
+
+    return filenames
+
+
+def get_output_filename(filename, output_dir=None, extension='.csv'):
+    # next to the project by default
+    basename = f'{os.path.splitext(filename)[0]}{extension}'
+    if output_dir is None:
+        return basename
+
+    return os.path.join(output_dir, os.path.basename(basename))
+
+
+def iter_export_files(filenames, output_dir=None, extension='.csv',
+                      n_points=None, n_jobs=None):
+    # yields (filename, output, number of rows, error) in the given order
+    # files are exported by a pool of n_jobs processes (default: one per
+    # cpu), each one getting chunks of files to limit communication
+    outputs = [get_output_filename(filename, output_dir, extension)
+               for filename in filenames]
+    args = (filenames, outputs, [n_points] * len(filenames),
+            _get_output_owners(filenames, outputs))
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(min(n_jobs, len(filenames)), 1)
+
+    if n_jobs == 1:
+        yield from map(_export_file_job, *args)
+        return
+
+    # imported only here (costly, not needed by single exports)
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(len(filenames) // (4 * n_jobs), 1)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        yield from executor.map(_export_file_job, *args, chunksize=chunksize)
+
+
+def _get_output_owners(filenames, outputs):
+    # first file exporting to each output, None for that file itself
+    # (e.g. a.json and a.npz both export to a.csv)
+    owners = {}
+    output_owners = []
+    for filename, output in zip(filenames, outputs):
+        key = os.path.normcase(os.path.abspath(output))
+        output_owners.append(owners.get(key, None))
+        owners.setdefault(key, filename)
+
+    return output_owners
+
+
+def _export_file_job(filename, output, n_points, output_owner=None):
+    # errors are reported per file instead of stopping the batch
+    try:
+        if output_owner is not None:
+            raise Exception(f'{output} is also the output of {output_owner}')
+
+        n_rows = export_file(filename, output, n_points=n_points)
+    except Exception as error:
+        return filename, output, 0, f'{type(error).__name__}: {error}'
+
+    return filename, output, n_rows, None
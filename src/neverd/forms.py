@@ -16,11 +16,12 @@ from neverd.generic_widgets import ScrollableFrame
 from neverd.utils import get_image_path
 from neverd.utils import disable_children
 from neverd.constants import ICON_NAMES
+from neverd.imaging import get_image_size
 
 
 # TODO: check translate in sliders -> should not change if line cannot
 
-IMG_FORMATS = ['.gif', '.jpg', '.jpeg', '.png']
+IMG_FORMATS = ['.gif', '.jpg', '.jpeg', '.png', '.tif', '.tiff', '.npy']
 
 
 class _BaseForm(tk.Toplevel, metaclass=ABCMeta):
@@ -523,9 +524,9 @@ class CanvasImageForm(_BaseForm):
 
         self.info_container['path'].set(path)
 
-        image = Image.open(path)
-        self.info_container['width'].set(image.size[0])
-        self.info_container['height'].set(image.size[1])
+        width, height = get_image_size(path)
+        self.info_container['width'].set(width)
+        self.info_container['height'].set(height)
 
 
 class _LabeledFrame(ttk.Frame):
@@ -145,3 +145,35 @@ class ScrollableFrame(ttk.Frame):
     def destroy(self, *args, **kwargs):
         super().destroy()
         self.canvas.master.destroy(*args, **kwargs)
+
+
+class ProgressWindow(tk.Toplevel):
+
+    def __init__(self, holder, title='Progress', on_cancel=None, length=250):
+        super().__init__(holder)
+        self.on_cancel_callback = on_cancel
+
+        self.title(title)
+        self.transient(holder)
+        self.protocol('WM_DELETE_WINDOW', self.on_cancel)
+
+        self.label = ttk.Label(self, text='')
+        self.label.pack(padx=10, pady=(10, 0))
+
+        self.progressbar = ttk.Progressbar(self, length=length,
+                                           mode='determinate')
+        self.progressbar.pack(padx=10, pady=10)
+
+        self.cancel_button = ttk.Button(self, text='Cancel',
+                                        command=self.on_cancel)
+        self.cancel_button.pack(pady=(0, 10))
+
+    def set_progress(self, value, maximum):
+        self.progressbar.configure(value=value, maximum=max(maximum, 1))
+        self.label.configure(text=f'{value}/{maximum}')
+
+    def on_cancel(self):
+        if self.on_cancel_callback is not None:
+            self.on_cancel_callback()
+
+        self.destroy()
@@ -1,15 +1,16 @@
 
-import json
+import time
 import tkinter as tk
 
 from neverd.objects import GeometricCanvas
 from neverd.objects import TYPE2OBJ
+from neverd.model import sort_objects_info
+from neverd.storage import load_data
 
 
 def load_from_json(filename, holder=None):
-
-    with open(filename, 'r') as file:
-        data = json.load(file)
+    # also loads binary (.npz) projects, by extension
+    data = load_data(filename)
 
     return load_from_dict(data, holder=holder)
 
@@ -27,6 +28,12 @@ def load_from_dict(data, holder=None):
 
 
 def update_canvas_from_dict(canvas, data):
+    for _ in iter_update_canvas_from_dict(canvas, data):
+        pass
+
+
+def iter_update_canvas_from_dict(canvas, data):
+    # yields (number of objects added, number of objects) while loading
 
     metadata = data.get('metadata', {})
     width = metadata.get('width', 800)
@@ -40,34 +47,106 @@ def update_canvas_from_dict(canvas, data):
     if calibration_info is not None:
         canvas.calibrate(**calibration_info)
     else:
-        return canvas
+        return
 
     # add image
     image_info = data.get('image', None)
     if image_info is not None:
         canvas.add_image(**image_info)
 
-    # add objects
-    objects_info = data.get('objects', None)
-    if objects_info is not None:
-        _add_objects_from_dict(canvas, objects_info)
+    # add objects (dependencies, e.g. slider anchors, first)
+    objects_info = sort_objects_info(data.get('objects', None) or [], TYPE2OBJ)
+    yield 0, len(objects_info)
 
+    for n_added, _ in enumerate(_iter_objects_from_dict(canvas, objects_info)):
+        yield n_added + 1, len(objects_info)
 
-def _add_objects_from_dict(canvas, objects_info):
-    for obj_type in ['Line', 'Slider', 'Point']:  # because order matters
-        _add_objects_by_type(canvas, objects_info, obj_type)
 
+def add_objects_from_dict(canvas, objects_info):
+    # dependencies (e.g. slider anchors) first
+    objects_info = sort_objects_info(objects_info, TYPE2OBJ)
+    return list(_iter_objects_from_dict(canvas, objects_info))
 
-def _add_objects_by_type(canvas, objects_info, obj_type):
 
+def _iter_objects_from_dict(canvas, objects_info):
     for object_info in objects_info:
-        if object_info.get('type') != obj_type:
-            continue
-
+        obj_type = object_info['type']
         object_info, show = _transform_obj_dict(canvas, object_info)
         obj = TYPE2OBJ[obj_type](**object_info)
         canvas.add_object(obj)
 
+        yield obj
+
+
+class CanvasLoader:
+    # fills a canvas from a dict in chunks scheduled with after, so that the
+    # window keeps responding and shows the objects added so far
+
+    def __init__(self, canvas, data, chunk_time=0.02, on_progress=None,
+                 on_done=None):
+        self.canvas = canvas
+        self.data = data
+        self.chunk_time = chunk_time  # s
+        self.on_progress = on_progress  # called with (n_added, n_objects)
+        self.on_done = on_done
+        self.progress = (0, 0)
+
+        self._steps = None
+        self._job = None
+        self._history = None
+
+    @property
+    def running(self):
+        return self._steps is not None
+
+    def start(self):
+        # not undoable, the history is detached until done (or cancelled)
+        self._history, self.canvas.history = self.canvas.history, None
+
+        self._steps = iter_update_canvas_from_dict(self.canvas, self.data)
+        self._job = self.canvas.after_idle(self._load_chunk)
+
+    def cancel(self):
+        # objects already added are kept
+        if self._job is not None:
+            self.canvas.after_cancel(self._job)
+            self._job = None
+
+        if self._steps is not None:
+            self._steps.close()
+            self._steps = None
+
+        self._attach_history()
+
+    def _attach_history(self):
+        if self._history is not None:
+            self._history.clear()
+            self.canvas.history = self._history
+            self._history = None
+
+    def _load_chunk(self):
+        self._job = None
+        end_time = time.perf_counter() + self.chunk_time
+
+        with self.canvas.batch():
+            for progress in self._steps:
+                self.progress = progress
+                if time.perf_counter() > end_time:
+                    break
+            else:
+                self._steps = None
+
+        if self.on_progress is not None:
+            self.on_progress(*self.progress)
+
+        if self._steps is None:
+            self._attach_history()
+            if self.on_done is not None:
+                self.on_done()
+            return
+
+        self._job = self.canvas.after(1, self._load_chunk)  # lets events in
+
 
 def _transform_obj_dict(canvas, obj_info):
     TYPE2TRANFORM = {'Slider': _transform_slider_dict}
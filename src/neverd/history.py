@@ -0,0 +1,395 @@
+import numpy as np
+
+from neverd.helpers import add_objects_from_dict
+
+
+class History:
+    # undo/redo stacks of the changes made to a canvas
+    # entries keep what changed only (e.g. moved points and their previous
+    # coordinates, or the attributes that were updated); changes made before
+    # the events are idle (or while the mouse button is held, e.g. dragging)
+    # form a single entry
+
+    def __init__(self, canvas, max_bytes=64 * 2**20):
+        self.canvas = canvas
+        self.max_bytes = max_bytes  # oldest entries are dropped above it
+
+        self._undo = []
+        self._redo = []
+        self._n_bytes = 0
+
+        # pending entry
+        self._states = {}  # object -> (key, attributes, geometry) before
+        self._added = {}  # ordered set
+        self._deleted = []  # object data
+        self._image = None  # (image data, ) before it was added or deleted
+        self._commit_job = None
+        self._held = False
+        self._applying = False
+
+    def start(self):
+        # generic sequences, as more specific ones would shadow the canvas
+        # bindings (e.g. flush_motions)
+        self.canvas.history = self
+        self.canvas.bind('<ButtonPress>', self._on_press, add='+')
+        self.canvas.bind('<ButtonRelease>', self._on_release, add='+')
+
+    def hold(self):
+        # changes are kept in the pending entry until release
+        self._held = True
+
+    def release(self):
+        self._held = False
+        self.commit()
+
+    def _on_press(self, event):
+        if event.num == 1:  # dragging
+            self.hold()
+
+    def _on_release(self, event):
+        if event.num == 1:
+            self.release()
+
+    def record_change(self, obj):
+        # called before obj changes
+        if self._applying or obj in self._states or obj in self._added:
+            return
+
+        self._states[obj] = (self._get_key(obj), self._get_attributes(obj),
+                             obj.get_geometry())
+        self._schedule_commit()
+
+    def record_added(self, obj):
+        if self._applying:
+            return
+
+        self._added[obj] = None
+        self._schedule_commit()
+
+    def record_deleted(self, obj):
+        if self._applying:
+            return
+
+        self._states.pop(obj, None)
+        if obj in self._added:  # nothing left to record
+            del self._added[obj]
+            return
+
+        self._deleted.append(_get_data(obj))
+        self._schedule_commit()
+
+    def record_image(self):
+        # called before the image is added or deleted
+        if self._applying or self._image is not None:
+            return
+
+        self._image = (self._get_image_data(), )
+        self._schedule_commit()
+
+    def commit(self):
+        if self._commit_job is not None:
+            self.canvas.after_cancel(self._commit_job)
+            self._commit_job = None
+
+        if not self._has_pending():
+            return
+
+        states, self._states = self._states, {}
+        added, self._added = self._added, {}
+        deleted, self._deleted = self._deleted, []
+        image, self._image = self._image, None
+
+        if image is not None:  # previous image data (the new one is kept)
+            image = (image[0], self._get_image_data())
+            if image[0] == image[1]:
+                image = None
+
+        changes = []
+        for obj, (key, attributes, geometry) in states.items():
+            new_key = self._get_key(obj)
+            if image is not None and new_key[0] == 'image':
+                continue
+            if self._find(new_key) is not obj:  # no longer in the canvas
+                continue
+
+            change = _Change(key, new_key, attributes,
+                             self._get_attributes(obj), geometry,
+                             obj.get_geometry())
+            if change:
+                changes.append(change)
+
+        added = [obj.name for obj in added
+                 if self._find(('object', obj.name)) is obj]
+        if not (changes or added or deleted or image):
+            return
+
+        self._drop_redo()
+        self._push(_Entry(changes, added, deleted, image))
+
+    def undo(self):
+        self.commit()
+        if not self._undo:
+            return
+
+        entry = self._undo.pop()
+        self._n_bytes -= entry.n_bytes
+        self._apply(entry.undo)
+
+        self._redo.append(entry)
+        self._n_bytes += entry.n_bytes
+
+    def redo(self):
+        self.commit()
+        if not self._redo:
+            return
+
+        entry = self._redo.pop()
+        self._n_bytes -= entry.n_bytes
+        self._apply(entry.redo)
+
+        self._push(entry)
+
+    def clear(self):
+        if self._commit_job is not None:
+            self.canvas.after_cancel(self._commit_job)
+            self._commit_job = None
+
+        self._undo = []
+        self._redo = []
+        self._n_bytes = 0
+        self._states = {}
+        self._added = {}
+        self._deleted = []
+        self._image = None
+
+    def _has_pending(self):
+        return bool(self._states or self._added or self._deleted
+                    or self._image is not None)
+
+    def _schedule_commit(self):
+        if self._commit_job is None:
+            self._commit_job = self.canvas.after_idle(self._on_idle)
+
+    def _on_idle(self):
+        self._commit_job = None
+        if not self._held:
+            self.commit()
+
+    def _drop_redo(self):
+        self._n_bytes -= sum(entry.n_bytes for entry in self._redo)
+        self._redo = []
+
+    def _push(self, entry):
+        self._undo.append(entry)
+        self._n_bytes += entry.n_bytes
+
+        while self._n_bytes > self.max_bytes and len(self._undo) > 1:
+            self._n_bytes -= self._undo.pop(0).n_bytes
+
+    def _apply(self, method):
+        # changes made while applying an entry are not recorded
+        self._applying = True
+        try:
+            with self.canvas.batch():
+                method(self)
+        finally:
+            self._applying = False
+
+    def _get_key(self, obj):
+        # objects are found by name, as they may have been recreated
+        if obj is self.canvas.calibration_rectangle:
+            return ('calibration', None)
+        elif obj is self.canvas.image:
+            return ('image', None)
+
+        return ('object', obj.name)
+
+    def _find(self, key):
+        kind, name = key
+        if kind == 'calibration':
+            return self.canvas.calibration_rectangle
+        elif kind == 'image':
+            return self.canvas.image
+
+        return self.canvas.get_by_name(name)
+
+    def _get_image_data(self):
+        if self.canvas.image is None:
+            return None
+
+        return self.canvas.image.as_dict()
+
+    def _set_image(self, data):
+        self.canvas.delete_image()
+        if data is not None:
+            self.canvas.add_image(**data)
+
+    def _get_attributes(self, obj):
+        return {name: getattr(obj, name) for name in obj.history_attributes}
+
+    def _delete(self, name):
+        # data of the deleted objects (sliders go with their anchor)
+        obj = self._find(('object', name))
+        if obj is None:
+            return []
+
+        deleted = [obj] + list(getattr(obj, 'sliders', ()))
+        objects_data = [_get_data(obj) for obj in deleted]
+        self.canvas.delete_object(obj.id)
+
+        return objects_data
+
+    def _restore(self, objects_data):
+        add_objects_from_dict(self.canvas,
+                              [dict(data) for data in objects_data])
+
+
+class _Entry:
+
+    def __init__(self, changes, added, deleted, image=None):
+        self.changes = changes
+        self.added = added  # names
+        self.deleted = deleted  # object data
+        self.image = image  # (previous, new) image data
+        self._added_data = None  # while undone
+
+    @property
+    def n_bytes(self):
+        n_bytes = 64 * (1 + len(self.added))
+        if self.image is not None:
+            n_bytes += sum(64 * len(data) for data in self.image
+                           if data is not None)
+        n_bytes += sum(change.n_bytes for change in self.changes)
+        for data in self.deleted + (self._added_data or []):
+            n_bytes += _get_data_n_bytes(data)
+
+        return n_bytes
+
+    def undo(self, history):
+        self._added_data = []
+        for name in reversed(self.added):
+            self._added_data.extend(history._delete(name))
+
+        for change in reversed(self.changes):
+            change.undo(history)
+
+        if self.image is not None:
+            history._set_image(self.image[0])
+
+        history._restore(self.deleted)
+
+    def redo(self, history):
+        for data in self.deleted:
+            history._delete(data['name'])
+
+        if self.image is not None:
+            history._set_image(self.image[1])
+
+        for change in self.changes:
+            change.redo(history)
+
+        history._restore(self._added_data)
+        self._added_data = None
+
+
+class _Change:
+    # attributes (previous and new values) and geometry delta of an object
+
+    def __init__(self, key, new_key, attributes, new_attributes, geometry,
+                 new_geometry):
+        self.keys = key, new_key
+
+        self.attributes = {}
+        self.new_attributes = {}
+        for name, value in attributes.items():
+            if not _equal(value, new_attributes[name]):
+                self.attributes[name] = value
+                self.new_attributes[name] = new_attributes[name]
+
+        self.geometry = _get_geometry_delta(geometry, new_geometry)
+
+    def __bool__(self):
+        return bool(self.attributes) or self.geometry is not None
+
+    @property
+    def n_bytes(self):
+        n_bytes = 64 * (1 + 2 * len(self.attributes))
+        if self.geometry is not None:
+            n_bytes += sum(value.nbytes for value in self.geometry[1:])
+
+        return n_bytes
+
+    def undo(self, history):
+        self._apply(history._find(self.keys[1]), self.attributes, undo=True)
+
+    def redo(self, history):
+        self._apply(history._find(self.keys[0]), self.new_attributes,
+                    undo=False)
+
+    def _apply(self, obj, attributes, undo):
+        if obj is None:
+            return
+
+        if self.geometry is not None:
+            obj.canvas.begin_change(obj)  # journaled, not recorded
+            obj.set_geometry(_apply_geometry_delta(obj.get_geometry(),
+                                                   self.geometry, undo))
+
+        if attributes:
+            obj.update(**attributes)
+
+
+def _equal(value, other):
+    return np.array_equal(value, other)
+
+
+def _get_geometry_delta(geometry, new_geometry):
+    # ('points', indices, previous, new) for the points that moved,
+    # ('translate', delta) if all moved together, ('replace', previous, new)
+    # if the number of points changed
+    if geometry is None:
+        return None
+
+    if geometry.shape != new_geometry.shape:
+        return ('replace', geometry, new_geometry)
+
+    points = geometry.reshape(-1, 2)
+    new_points = new_geometry.reshape(-1, 2)
+
+    diff = new_points - points
+    indices = np.flatnonzero(np.any(diff != 0., axis=1))
+    if len(indices) == 0:
+        return None
+
+    if len(indices) == len(points) > 1 and np.allclose(diff, diff[0]):
+        return ('translate', diff[0])
+
+    return ('points', indices, points[indices], new_points[indices])
+
+
+def _apply_geometry_delta(geometry, delta, undo):
+    kind = delta[0]
+    if kind == 'replace':
+        return delta[1] if undo else delta[2]
+
+    points = geometry.reshape(-1, 2)
+    if kind == 'translate':
+        points += -delta[1] if undo else delta[1]
+    else:
+        points[delta[1]] = delta[2] if undo else delta[3]
+
+    return geometry
+
+
+def _get_data(obj):
+    # coordinates as arrays (smaller than lists of floats)
+    data = obj.as_dict()
+    if 'coords' in data:
+        data['coords'] = np.array(data['coords'], dtype=float)
+
+    return data
+
+
+def _get_data_n_bytes(data):
+    coords = data.get('coords', None)
+    return 64 * len(data) + (coords.nbytes if coords is not None else 0)
@@ -0,0 +1,500 @@
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+# raw tiff modes that can be memory-mapped: (dtype, n channels)
+_RAW_MODES = {
+    'L': ('u1', 1),
+    'RGB': ('u1', 3),
+    'RGBA': ('u1', 4),
+    'I;16': ('<u2', 1),
+    'I;16B': ('>u2', 1),
+    'F;32F': ('<f4', 1),
+}
+
+
+class ImagePyramid:
+    # successively halved copies of an image, built on demand
+    # used for fast approximate resizing (e.g. while dragging)
+
+    def __init__(self, image, min_size=64):
+        self.levels = [image]
+        self.min_size = min_size
+
+    @property
+    def image(self):
+        return self.levels[0]
+
+    def get_level(self, size):
+        # coarsest level that is still at least as large as size
+        width, height = self.image.size
+        factor = min(width / max(size[0], 1), height / max(size[1], 1))
+        index = int(math.floor(math.log2(factor))) if factor >= 2 else 0
+
+        while len(self.levels) <= index:
+            level = self.levels[-1]
+            if min(level.size) // 2 < self.min_size:
+                break
+
+            level_size = ((level.size[0] + 1) // 2, (level.size[1] + 1) // 2)
+            self.levels.append(level.resize(level_size, Image.BOX))
+
+        return self.levels[min(index, len(self.levels) - 1)]
+
+
+class ImageSource:
+    # decoded image, kept in memory
+    # it may be decoded at a lower resolution than its size (JPEG draft)
+
+    def __init__(self, image, key=None, size=None):
+        self.image = image
+        self.key = key  # identifies the image content in the cache
+        self.pyramid = ImagePyramid(image)
+        self._size = image.size if size is None else tuple(size)
+
+    @property
+    def size(self):
+        return self._size
+
+    def covers(self, size):
+        # whether the decoded resolution is enough to display at size
+        return (self.image.width >= min(size[0], self.size[0])
+                and self.image.height >= min(size[1], self.size[1]))
+
+    def render(self, size, box, resample=Image.BICUBIC, live=False):
+        if live:
+            return _render_tile(self.pyramid.get_level(size), size, box,
+                                Image.BILINEAR)
+
+        return _render_tile(self.image, size, box, resample)
+
+
+class ArraySource:
+    # (H, W) or (H, W, C) array-like (e.g. memory-mapped), only the rows and
+    # columns needed by each tile are read
+
+    def __init__(self, array, key=None, value_range=None):
+        if len(array.shape) not in (2, 3) or (
+                len(array.shape) == 3 and array.shape[2] not in (1, 3, 4)):
+            raise Exception(f'Unsupported image shape: {array.shape}')
+
+        self.array = array
+        self.key = key
+        self.value_range = value_range  # mapped to 0-255 (non uint8 only)
+
+    @property
+    def size(self):
+        return self.array.shape[1], self.array.shape[0]
+
+    def covers(self, size):
+        return True
+
+    def render(self, size, box, resample=Image.BICUBIC, live=False):
+        width, height = self.size
+        scale_x = width / size[0]
+        scale_y = height / size[1]
+        x0, y0 = box[0] * scale_x, box[1] * scale_y
+        x1, y1 = box[2] * scale_x, box[3] * scale_y
+
+        # skip source pixels when downsampling (nearest while live)
+        # margin keeps the filter support across tile borders
+        step = max(int(min(scale_x, scale_y) / (1 if live else 2)), 1)
+        support = int(math.ceil(max(scale_x, scale_y, 1)))
+        margin = 0 if live else 2 * step * support
+        i0 = max(int(y0) - margin, 0)
+        i1 = min(int(math.ceil(y1)) + margin, height)
+        j0 = max(int(x0) - margin, 0)
+        j1 = min(int(math.ceil(x1)) + margin, width)
+
+        region = np.ascontiguousarray(self.array[i0:i1:step, j0:j1:step])
+        if region.ndim == 3 and region.shape[2] == 1:
+            region = region[..., 0]
+        image = Image.fromarray(_to_uint8(region, self.value_range))
+
+        region_box = ((x0 - j0) / step, (y0 - i0) / step,
+                      (x1 - j0) / step, (y1 - i0) / step)
+        return image.resize((box[2] - box[0], box[3] - box[1]),
+                            Image.NEAREST if live else resample,
+                            box=region_box)
+
+
+class PlaceholderSource:
+    # uniform image shown while the actual source is loading
+
+    def __init__(self, size, color=(128, 128, 128)):
+        self.size = (int(size[0]), int(size[1]))
+        self.key = None  # never cached
+        self.color = color
+
+    def covers(self, size):
+        return False
+
+    def render(self, size, box, resample=Image.BICUBIC, live=False):
+        return Image.new('RGB', (box[2] - box[0], box[3] - box[1]), self.color)
+
+
+class _StripArray:
+    # rows of an image stored in separate (memory-mapped) file strips
+
+    def __init__(self, strips, shape, dtype):
+        self.strips = strips  # [(first row, array)]
+        self.shape = shape
+        self.dtype = dtype
+
+    def __getitem__(self, key):
+        rows, cols = key
+        start, stop, step = rows.indices(self.shape[0])
+
+        parts = []
+        for row, strip in self.strips:
+            first = start + -(-max(row - start, 0) // step) * step
+            last = min(stop, row + strip.shape[0])
+            if first < last:
+                parts.append(strip[first - row:last - row:step, cols])
+
+        if not parts:
+            return np.empty((0, ) + self.shape[1:], dtype=self.dtype)[:, cols]
+
+        return np.concatenate(parts)
+
+
+class ImageTiler:
+    # tiles of an image displayed at a given size, rendered from the source
+    # only when requested (e.g. when visible)
+
+    def __init__(self, source, tile_size=512, cache=None):
+        self.source = source
+        self.tile_size = tile_size
+        self.cache = IMAGE_CACHE if cache is None else cache
+
+    @property
+    def key(self):
+        return self.source.key
+
+    def get_tile_indices(self, size, region):
+        # tiles intersecting region (x0, y0, x1, y1), in displayed pixels
+        x0, y0, x1, y1 = region
+        n = self.tile_size
+
+        i_min = max(int(x0 // n), 0)
+        i_max = min(int(math.ceil(x1 / n)), int(math.ceil(size[0] / n)))
+        j_min = max(int(y0 // n), 0)
+        j_max = min(int(math.ceil(y1 / n)), int(math.ceil(size[1] / n)))
+
+        return [(i, j) for j in range(j_min, j_max) for i in range(i_min, i_max)]
+
+    def get_tile_box(self, size, index):
+        i, j = index
+        n = self.tile_size
+
+        return (i * n, j * n, min((i + 1) * n, size[0]),
+                min((j + 1) * n, size[1]))
+
+    def get_tile(self, size, index, resample=Image.BICUBIC, live=False):
+        # live tiles are approximate (from the pyramid) and not cached
+        size = (int(size[0]), int(size[1]))
+        box = self.get_tile_box(size, index)
+
+        if live:
+            return self.source.render(size, box, live=True)
+
+        key = (self.key, size, resample, index)
+        tile = self.cache.get(key) if self.key is not None else None
+        if tile is None:
+            tile = self.source.render(size, box, resample)
+            if self.key is not None:
+                self.cache.put(key, tile)
+
+        return tile
+
+
+def _render_tile(source, size, box, resample):
+    scale_x = source.width / size[0]
+    scale_y = source.height / size[1]
+    source_box = (box[0] * scale_x, box[1] * scale_y,
+                  box[2] * scale_x, box[3] * scale_y)
+
+    return source.resize((box[2] - box[0], box[3] - box[1]), resample,
+                         box=source_box)
+
+
+def _to_uint8(array, value_range=None):
+    if array.dtype == np.uint8:
+        return array
+
+    if value_range is None:
+        if np.issubdtype(array.dtype, np.integer):
+            info = np.iinfo(array.dtype)
+            value_range = (info.min, info.max)
+        else:
+            value_range = (0., 1.)
+
+    v_min, v_max = value_range
+    array = (array.astype(np.float32) - v_min) * (255. / (v_max - v_min))
+    return np.clip(array, 0, 255).astype(np.uint8)
+
+
+class ImageCache:
+    # least recently used images, bounded by (approximate) memory
+
+    def __init__(self, max_bytes=512 * 2**20):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()  # sources are loaded in worker threads
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, key):
+        return key in self._images
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key, None)
+            if image is not None:
+                self._images.move_to_end(key)
+
+        return image
+
+    def put(self, key, image):
+        with self._lock:
+            if key in self._images:
+                self.n_bytes -= get_n_bytes(self._images.pop(key))
+
+            self._images[key] = image
+            self.n_bytes += get_n_bytes(image)
+
+            # the newest image is always kept
+            while self.n_bytes > self.max_bytes and len(self._images) > 1:
+                _, old_image = self._images.popitem(last=False)
+                self.n_bytes -= get_n_bytes(old_image)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.n_bytes = 0
+
+
+class ImageLoader:
+    # opens image sources in worker threads (pillow releases the GIL while
+    # decoding and resampling)
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._executor = None
+
+    def submit(self, path, size=None, region=None):
+        # tiles of size covering region are rendered in the worker as well
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix='neverd-image')
+
+        return self._executor.submit(_load_tiler, path, size, region)
+
+
+def _load_tiler(path, size=None, region=None):
+    tiler = ImageTiler(open_source(path, size=size))
+
+    if size is not None and region is not None:
+        for index in tiler.get_tile_indices(size, region):
+            tiler.get_tile(size, index)
+
+    return tiler
+
+
+IMAGE_CACHE = ImageCache()
+IMAGE_LOADER = ImageLoader()
+_FILE_HASHES = {}
+
+
+def get_n_bytes(image):
+    # pillow stores multiband images with 4 bytes per pixel
+    if image.mode in ('1', 'L', 'P'):
+        bytes_per_pixel = 1
+    elif image.mode.startswith('I;16'):
+        bytes_per_pixel = 2
+    else:
+        bytes_per_pixel = 4
+
+    return image.width * image.height * bytes_per_pixel
+
+
+def get_file_key(path):
+    # cheap identity for memory-mapped files (no content hashing)
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def get_file_hash(path, chunk_size=2**20):
+    stat_key = get_file_key(path)
+
+    file_hash = _FILE_HASHES.get(stat_key, None)
+    if file_hash is None:
+        hasher = hashlib.blake2b()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                hasher.update(chunk)
+
+        file_hash = _FILE_HASHES[stat_key] = hasher.hexdigest()
+
+    return file_hash
+
+
+def open_image(path, size=None, cache=IMAGE_CACHE):
+    # decoded once per file content
+    # with size, JPEG files are decoded at the coarsest draft scale that is
+    # still at least as large as size (unless fully decoded already)
+    file_hash = get_file_hash(path)
+    image = cache.get((file_hash, None, None))
+    if image is not None:
+        return image
+
+    image = Image.open(path)
+    reduce = get_draft_reduce(image, size)
+    key = (file_hash, None, None)
+    if reduce > 1:
+        key = (file_hash, 'draft', reduce)
+
+    cached_image = cache.get(key)
+    if cached_image is not None:
+        image.close()
+        return cached_image
+
+    if reduce > 1:
+        image.draft(image.mode,
+                    (image.width // reduce, image.height // reduce))
+    image.load()
+    cache.put(key, image)
+
+    return image
+
+
+def get_draft_reduce(image, size):
+    # JPEG decoding can skip coefficients to downscale by 2, 4 or 8
+    if size is None or image.format != 'JPEG':
+        return 1
+
+    factor = min(image.width // max(int(size[0]), 1),
+                 image.height // max(int(size[1]), 1))
+    return max(reduce for reduce in (1, 2, 4, 8) if reduce <= max(factor, 1))
+
+
+def get_image_size(path):
+    # from the file header only
+    if os.path.splitext(path)[1].lower() == '.npy':
+        shape = np.load(path, mmap_mode='r').shape
+        return shape[1], shape[0]
+
+    with Image.open(path) as image:
+        return image.size
+
+
+def open_source(path, size=None, decode=True):
+    # .npy and uncompressed tiff files are memory-mapped instead of decoded
+    # size is the (expected) displayed size, see open_image
+    # None if decode is False and the image is not decoded yet
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == '.npy':
+        array = np.load(path, mmap_mode='r')
+        return ArraySource(array, key=get_file_key(path))
+
+    if ext in ('.tif', '.tiff'):
+        array = _map_tiff(path)
+        if array is not None:
+            return ArraySource(array, key=get_file_key(path))
+
+    if not decode:
+        file_hash = _FILE_HASHES.get(get_file_key(path), None)
+        if file_hash is None or (file_hash, None, None) not in IMAGE_CACHE:
+            return None
+
+    image = open_image(path, size=size)
+    native_size = image.size if size is None else get_image_size(path)
+
+    # tiles of reduced decodes are cached apart
+    key = get_file_hash(path)
+    if image.size != native_size:
+        key = (key, image.size)
+
+    return ImageSource(image, key=key, size=native_size)
+
+
+def open_thumbnail(path):
+    # fast low resolution source (JPEG only), None otherwise
+    with Image.open(path) as image:
+        if image.format != 'JPEG':
+            return None
+
+    return open_source(path, size=(1, 1))
+
+
+def open_raw(path, shape, dtype='u1', offset=0, value_range=None):
+    # headerless pixel data (row-major, channels last)
+    array = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+    return ArraySource(array, key=get_file_key(path), value_range=value_range)
+
+
+def _map_tiff(path):
+    # None if the pixel data cannot be mapped (e.g. compressed)
+    # the file is mapped once (a file descriptor per mapping) and strips are
+    # views of it, contiguous strips being merged
+    with Image.open(path) as image:
+        width, height = image.size
+        tiles = list(image.tile)
+
+    runs = []  # [first row, last row, offset, dtype, row shape]
+    for codec, extents, offset, args in tiles:  # by position (Pillow < 11)
+        x0, y0, x1, y1 = extents
+        if not isinstance(args, tuple):
+            args = (args, )
+        rawmode, stride, orientation = (args + (0, 1))[:3]
+        if (codec != 'raw' or rawmode not in _RAW_MODES
+                or x0 != 0 or x1 != width or orientation != 1):
+            return None
+
+        dtype, n_channels = _RAW_MODES[rawmode]
+        dtype = np.dtype(dtype)
+        row_n_bytes = width * n_channels * dtype.itemsize
+        if stride not in (0, row_n_bytes):
+            return None
+
+        run = runs[-1] if runs else None
+        if (run is not None and run[1] == y0 and run[3] == dtype
+                and run[2] + (y0 - run[0]) * row_n_bytes == offset):
+            run[1] = y1
+        else:
+            row_shape = (width, ) + ((n_channels, ) if n_channels > 1 else ())
+            runs.append([y0, y1, offset, dtype, row_shape])
+
+    if not runs:
+        return None
+
+    try:
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+    except (OSError, ValueError):
+        return None
+
+    strips = []
+    for y0, y1, offset, dtype, row_shape in runs:
+        shape = (y1 - y0, ) + row_shape
+        n_bytes = int(np.prod(shape)) * dtype.itemsize
+        if offset + n_bytes > data.shape[0]:  # truncated file
+            return None
+
+        strips.append(
+            (y0, data[offset:offset + n_bytes].view(dtype).reshape(shape)))
+
+    if len(strips) == 1 and strips[0][1].shape[0] == height:
+        return strips[0][1]
+
+    shape = (height, ) + strips[0][1].shape[1:]
+    return _StripArray(strips, shape, strips[0][1].dtype)
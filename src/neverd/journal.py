@@ -0,0 +1,178 @@
+import json
+import os
+
+from neverd.storage import dump_data
+from neverd.storage import get_journal_filename
+
+
+class Journal:
+    # append-only log of the unsaved changes made to a canvas since its
+    # project file was written, for crash recovery (the project file is only
+    # written by save)
+
+    def __init__(self, canvas, filename, autosave_interval=5000,
+                 compact_ratio=1.):
+        self.canvas = canvas
+        self.filename = filename
+        self.autosave_interval = autosave_interval  # ms
+        # appended entries size / last snapshot (or project file) size
+        self.compact_ratio = compact_ratio
+
+        self._keys = {}  # object -> key
+        self._used_keys = set()
+        self._changed = {}  # ordered set
+        self._deleted = []  # keys
+        self._snapshot_size = 0  # bytes, 0 if the journal has no snapshot
+        self._autosave_job = None
+
+    @property
+    def journal_filename(self):
+        return get_journal_filename(self.filename)
+
+    def start(self):
+        # the canvas is expected to match the project file (or the journal,
+        # when recovered), nothing is written
+        self.canvas.journal = self
+        self._reset_keys()
+        self._schedule_autosave()
+
+    def stop(self, discard=False):
+        if self._autosave_job is not None:
+            self.canvas.after_cancel(self._autosave_job)
+            self._autosave_job = None
+
+        if self.canvas.journal is self:
+            self.canvas.journal = None
+
+        if discard:
+            self.discard()
+
+    def discard(self):
+        if os.path.exists(self.journal_filename):
+            os.remove(self.journal_filename)
+
+        self._snapshot_size = 0
+        self._changed = {}
+        self._deleted = []
+
+    def mark_changed(self, obj):
+        self._changed[obj] = None
+
+    def mark_deleted(self, obj):
+        self._changed.pop(obj, None)
+
+        key = self._get_special_key(obj)
+        if key is not None:
+            self._deleted.append({'op': 'delete', 'key': key})
+        elif obj in self._keys:
+            key = self._keys.pop(obj)
+            self._used_keys.discard(key)
+            self._deleted.append({'op': 'delete', 'object': key})
+
+    def flush(self):
+        # only changed objects are serialized
+        if not self._changed and not self._deleted:
+            return
+
+        entries = self._deleted
+
+        changed = self._changed
+        if self.canvas.calibration_rectangle in changed:
+            # real coordinates of every object may have changed
+            changed.update(dict.fromkeys(self.canvas.objects.values()))
+
+        for obj in changed:
+            entry = self._get_entry(obj)
+            if entry is not None:
+                entry['data'] = obj.as_dict()
+                entries.append(entry)
+
+        self._changed = {}
+        self._deleted = []
+
+        with open(self.journal_filename, 'a') as file:
+            for entry in entries:
+                file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+        if self._needs_compaction():
+            self.compact()
+
+    def compact(self):
+        # replaces the journal by a snapshot of the canvas (the project file
+        # is left untouched)
+        entry = {'op': 'snapshot', 'data': self.canvas.as_dict()}
+
+        temp_filename = f'{self.journal_filename}.tmp'
+        with open(temp_filename, 'w') as file:
+            file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        os.replace(temp_filename, self.journal_filename)
+        self._snapshot_size = os.path.getsize(self.journal_filename)
+
+        self._reset_keys()
+
+    def save(self):
+        # writes the project file, the journal is no longer needed
+        dump_data(self.canvas.as_dict(), self.filename)
+        self.discard()
+        self._reset_keys()
+
+    def _needs_compaction(self):
+        # the snapshot size is the reference once there is one (a json
+        # snapshot is much larger than a .npz project file)
+        size = os.path.getsize(self.journal_filename)
+        if self._snapshot_size:
+            return (size - self._snapshot_size
+                    > self.compact_ratio * self._snapshot_size)
+
+        return (os.path.exists(self.filename)
+                and size > self.compact_ratio * os.path.getsize(self.filename))
+
+    def _reset_keys(self):
+        # keys are the names the objects have in the project file (or the
+        # last snapshot)
+        self._keys = {obj: obj.name for obj in self.canvas.objects.values()}
+        self._used_keys = set(self._keys.values())
+        self._changed = {}
+        self._deleted = []
+
+    def _get_special_key(self, obj):
+        if obj is self.canvas.calibration_rectangle:
+            return 'calibration'
+        elif obj is self.canvas.image:
+            return 'image'
+
+        return None
+
+    def _get_entry(self, obj):
+        # None for objects no longer (or not yet) in the canvas
+        key = self._get_special_key(obj)
+        if key is not None:
+            return {'op': 'set', 'key': key}
+
+        if self.canvas.get_by_name(obj.name) is not obj:
+            return None
+
+        key = self._keys.get(obj, None)
+        if key is None:
+            key = self._keys[obj] = self._get_new_key(obj.name)
+            self._used_keys.add(key)
+
+        return {'op': 'set', 'object': key}
+
+    def _get_new_key(self, name):
+        # the name, unless a renamed object still uses it as key
+        key = name
+        index = 1
+        while key in self._used_keys:
+            key = f'{name}#{index}'
+            index += 1
+
+        return key
+
+    def _schedule_autosave(self):
+        self._autosave_job = self.canvas.after(self.autosave_interval,
+                                               self._autosave)
+
+    def _autosave(self):
+        self.flush()
+        self._schedule_autosave()
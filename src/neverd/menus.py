@@ -1,13 +1,22 @@
 
-import json
+from functools import partial
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import messagebox
 
+from neverd.generic_widgets import ProgressWindow
+from neverd.helpers import CanvasLoader
 from neverd.helpers import update_canvas_from_dict
+from neverd.history import History
+from neverd.journal import Journal
+from neverd.storage import has_journal
+from neverd.storage import load_data
 from neverd.utils import get_root
 
 
+PROJECT_FILETYPES = (('json files', '.json'), ('binary files', '.npz'))
+
+
 class DefaultMenubar:
     # TODO: overlap with opentea
 
@@ -34,6 +43,7 @@ class DefaultMenubar:
 
     def _add_menus(self):
         self.add_menu(FileMenu(self.canvas))
+        self.add_menu(EditMenu(self.canvas, menubar=self.menubar))
 
     def add_menu(self, menu):
         self.menus.append(menu)
@@ -49,15 +59,22 @@ class FileMenu(tk.Menu):
         if menubar is None:
             menubar = tk.Menu()
 
-        self.filename = filename
         self.canvas = canvas
+        self.journal = None
+        self.filename = filename
         self._root = None
+        self._loader = None
+        self._progress_window = None
 
         super().__init__(menubar, tearoff=0, **kwargs)
         menubar.add_cascade(label=label, menu=self)
 
         self._add_items()
 
+        # closing the window exits as the menu does (the journal is only
+        # kept after a crash)
+        self.root.protocol('WM_DELETE_WINDOW', self.on_exit)
+
     @property
     def root(self):
         if self._root is None:
@@ -65,6 +82,47 @@ class FileMenu(tk.Menu):
 
         return self._root
 
+    @property
+    def filename(self):
+        return self._filename
+
+    @filename.setter
+    def filename(self, value):
+        # the canvas is expected to show the project file; unsaved changes
+        # left by a crash are applied if the user accepts
+        recovered = value is not None and self._ask_recover(value)
+        if recovered:
+            self.canvas.clear()
+            update_canvas_from_dict(self.canvas, load_data(value, replay=True))
+
+        self._set_filename(value, recovered=recovered)
+
+    def _set_filename(self, filename, recovered=False):
+        # unsaved changes are journaled next to the project file; the journal
+        # of the previous file is discarded (saved elsewhere or declined)
+        self._filename = filename
+
+        if self.journal is not None:
+            self.journal.stop(discard=True)
+            self.journal = None
+
+        if filename is None:
+            return
+
+        self.journal = Journal(self.canvas, filename)
+        if not recovered:
+            self.journal.discard()
+
+        self.journal.start()
+        if recovered:  # kept in the journal until saved
+            self.journal.compact()
+
+    def _ask_recover(self, filename):
+        return has_journal(filename) and messagebox.askyesno(
+            'Recover changes',
+            'Unsaved changes to this project were found (e.g. after a '
+            'crash). Recover them?')
+
     def _add_items(self):
         self.add_command(label='Save', command=self.on_save)
         self.add_command(label='Save as...', command=self.on_save_as)
@@ -73,7 +131,7 @@ class FileMenu(tk.Menu):
         self.add_command(label='Exit', command=self.on_exit)
 
     def _save(self):
-        self.canvas.dump(self.filename)
+        self.journal.save()
 
     def on_save(self):
         if self.filename is None:
@@ -82,30 +140,64 @@ class FileMenu(tk.Menu):
             self._save()
 
     def on_save_as(self):
-        filename = filedialog.asksaveasfilename(defaultextension='.json')
+        filename = filedialog.asksaveasfilename(defaultextension='.json',
+                                                filetypes=PROJECT_FILETYPES)
 
         if filename == '':
             return
 
-        self.filename = filename
+        self._set_filename(filename)
         self._save()
 
         return filename
 
     def on_load(self):
         filename = filedialog.askopenfilename(title="Load file",
-                                              filetypes=(('json files', '.json'),))
+                                              filetypes=PROJECT_FILETYPES)
 
         if filename == '':
             return
 
+        self._cancel_load()
+        self.filename = None
         self.canvas.clear()
 
-        with open(filename, 'r') as file:
-            data = json.load(file)
+        recovered = self._ask_recover(filename)
+        data = load_data(filename, replay=recovered)
 
-        self.filename = filename
-        update_canvas_from_dict(self.canvas, data)
+        # objects are added in chunks, the window keeps responding
+        self._progress_window = ProgressWindow(self.root, title='Loading',
+                                               on_cancel=self._on_load_cancel)
+        self._loader = CanvasLoader(
+            self.canvas, data,
+            on_progress=self._progress_window.set_progress,
+            on_done=partial(self._on_load_done, filename, recovered))
+        self._loader.start()
+
+    def _on_load_done(self, filename, recovered):
+        self._set_filename(filename, recovered=recovered)
+        self._loader = None
+
+        self._progress_window.destroy()
+        self._progress_window = None
+
+    def _on_load_cancel(self):
+        self._progress_window = None  # closes itself
+        self._cancel_load()
+
+    def _cancel_load(self):
+        # a partially loaded project is discarded
+        if self._loader is None:
+            return
+
+        self._loader.cancel()
+        self._loader = None
+        self.canvas.clear()
+        self.filename = None
+
+        if self._progress_window is not None:
+            self._progress_window.destroy()
+            self._progress_window = None
 
     def on_exit(self):
         save = messagebox.askyesno('Save before exiting',
@@ -114,4 +206,49 @@ class FileMenu(tk.Menu):
         if save:
             self.on_save()
 
+        if self.journal is not None:  # saved or declined
+            self.journal.stop(discard=True)
+
         self.root.quit()
+
+
+class EditMenu(tk.Menu):
+
+    def __init__(self, canvas, label='Edit', menubar=None, **kwargs):
+        if menubar is None:
+            menubar = tk.Menu()
+
+        self.canvas = canvas
+        self.history = History(canvas)
+        self.history.start()
+        self._root = None
+
+        super().__init__(menubar, tearoff=0, **kwargs)
+        menubar.add_cascade(label=label, menu=self)
+
+        self._add_items()
+        self._bind_shortcuts()
+
+    @property
+    def root(self):
+        if self._root is None:
+            self._root = get_root(self.canvas.master)
+
+        return self._root
+
+    def _add_items(self):
+        self.add_command(label='Undo', accelerator='Ctrl+Z',
+                         command=self.on_undo)
+        self.add_command(label='Redo', accelerator='Ctrl+Y',
+                         command=self.on_redo)
+
+    def _bind_shortcuts(self):
+        self.root.bind('<Control-z>', self.on_undo)
+        self.root.bind('<Control-y>', self.on_redo)
+        self.root.bind('<Control-Z>', self.on_redo)  # with shift
+
+    def on_undo(self, *args):
+        self.history.undo()
+
+    def on_redo(self, *args):
+        self.history.redo()
@@ -0,0 +1,652 @@
+
+import numpy as np
+
+
+class _CalibrationPoint:
+
+    def __init__(self, canvas_coords, coords):
+        self._canvas_coords = np.array(canvas_coords)
+        self._coords = np.array(coords)
+
+    def __sub__(self, other):
+        canvas_diff = self.canvas_coords - other.canvas_coords
+        real_diff = self.coords - other.coords
+
+        return canvas_diff, real_diff
+
+    @property
+    def canvas_coords(self):
+        return self._canvas_coords
+
+    @property
+    def coords(self):
+        return self._coords
+
+
+class Calibration:
+    # per-axis affine map between canvas and real coordinates
+
+    def __init__(self, canvas_coords, coords):
+        self._canvas_coords = np.array(canvas_coords, dtype=float)
+        self._coords = np.array(coords, dtype=float)
+        self._update_transform()
+
+    @property
+    def canvas_coords(self):
+        return self._canvas_coords.copy()
+
+    @canvas_coords.setter
+    def canvas_coords(self, values):
+        self._canvas_coords = np.array(values, dtype=float)
+        self._update_transform()
+
+    @property
+    def coords(self):
+        return self._coords.copy()
+
+    @coords.setter
+    def coords(self, values):
+        self._coords = np.array(values, dtype=float)
+        self._update_transform()
+
+    @property
+    def scale(self):
+        return self._scale
+
+    @property
+    def offset(self):
+        return self._offset
+
+    def set_point(self, index, canvas_coords=None, coords=None):
+        if canvas_coords is not None:
+            self._canvas_coords[index] = canvas_coords
+
+        if coords is not None:
+            self._coords[index] = coords
+
+        self._update_transform()
+
+    def _update_transform(self):
+        # real = canvas * scale + offset
+        canvas_diff = self._canvas_coords[1] - self._canvas_coords[0]
+        real_diff = self._coords[1] - self._coords[0]
+
+        self._scale = real_diff / canvas_diff
+        self._offset = self._coords[0] - self._canvas_coords[0] * self._scale
+
+        self._inv_scale = canvas_diff / real_diff
+        self._inv_offset = self._canvas_coords[0] - self._coords[0] * self._inv_scale
+
+    def get_position(self, index):
+        canvas_coords = self._canvas_coords[index]
+        other_canvas_coords = self._canvas_coords[1 - index]
+
+        if canvas_coords[0] < other_canvas_coords[0]:
+            if canvas_coords[1] < other_canvas_coords[1]:
+                return 'top_left'
+            else:
+                return 'bottom_left'
+
+        else:
+            if canvas_coords[1] < other_canvas_coords[1]:
+                return 'top_right'
+            else:
+                return 'bottom_right'
+
+    def get_corners(self):
+        pt1 = _CalibrationPoint(self._canvas_coords[0], self._coords[0])
+        pt2 = _CalibrationPoint(self._canvas_coords[1], self._coords[1])
+        pt1_position = self.get_position(0)
+        pt2_position = self.get_position(1)
+
+        if pt1_position == 'top_left' and pt2_position == 'bottom_right':
+            return pt1, pt2
+        elif pt1_position == 'bottom_right' and pt2_position == 'top_left':
+            return pt2, pt1
+        elif (pt1_position == 'bottom_left' and pt2_position == 'top_right') or pt1_position == 'top_right' and pt2_position == 'bottom_left':
+            if (pt1_position == 'bottom_left' and pt2_position == 'top_right'):
+                pt_bottom_left, pt_top_right = pt1, pt2
+            else:
+                pt_bottom_left, pt_top_right = pt2, pt1
+
+            # pt top left
+            canvas_coords = (pt_bottom_left.canvas_coords[0],
+                             pt_top_right.canvas_coords[1])
+            coords = (pt_bottom_left.coords[0],
+                      pt_top_right.coords[1])
+            pt_top_left = _CalibrationPoint(canvas_coords, coords)
+
+            # pt bottom right
+            canvas_coords = (pt_top_right.canvas_coords[0],
+                             pt_bottom_left.canvas_coords[1])
+            coords = (pt_top_right.coords[0],
+                      pt_bottom_left.coords[1])
+            pt_bottom_right = _CalibrationPoint(canvas_coords, coords)
+
+            return pt_top_left, pt_bottom_right
+
+    def map2real(self, coords):
+        # accepts a single point or an (N, 2) array
+        return np.asarray(coords, dtype=float) * self._scale + self._offset
+
+    def map2canvas(self, coords):
+        return np.asarray(coords, dtype=float) * self._inv_scale + self._inv_offset
+
+
+class _Block:
+    __slots__ = ('start', 'stop')
+
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+
+class PointStore:
+    # contiguous (N, 2) canvas coordinates of all the objects of a document
+    # each object owns a block (index range) that may move on compaction
+
+    def __init__(self, capacity=256):
+        self._data = np.empty((capacity, 2))
+        self._end = 0
+        self._n_used = 0
+        self._blocks = set()
+
+    def __len__(self):
+        return self._n_used
+
+    @property
+    def data(self):
+        # includes holes left by released blocks
+        return self._data[:self._end]
+
+    @property
+    def blocks(self):
+        return sorted(self._blocks, key=lambda block: block.start)
+
+    def view(self, block):
+        return self._data[block.start:block.stop]
+
+    def allocate(self, n):
+        self._reserve(n)
+
+        block = _Block(self._end, self._end + n)
+        self._blocks.add(block)
+        self._end += n
+        self._n_used += n
+
+        return block
+
+    def release(self, block):
+        self._blocks.remove(block)
+        self._n_used -= len(block)
+
+        if block.stop == self._end:
+            self._end = block.start
+
+        self._maybe_compact()
+
+    def resize(self, block, n):
+        # keeps the first points of the block
+        n_old = len(block)
+
+        if block.stop == self._end:
+            self._reserve(n - n_old)
+            block.stop = block.start + n
+            self._end = block.stop
+
+        elif n > n_old:  # move to the end
+            values = self.view(block).copy()
+            self._reserve(n)
+
+            block.start, block.stop = self._end, self._end + n
+            self._data[block.start:block.start + n_old] = values
+            self._end = block.stop
+
+        else:
+            block.stop = block.start + n
+
+        self._n_used += n - n_old
+        self._maybe_compact()
+
+    def compact(self):
+        data = np.empty_like(self._data)
+
+        end = 0
+        for block in self.blocks:
+            n = len(block)
+            data[end:end + n] = self.view(block)
+            block.start, block.stop = end, end + n
+            end += n
+
+        self._data = data
+        self._end = end
+
+    def _reserve(self, n):
+        capacity = self._data.shape[0]
+        if self._end + n <= capacity:
+            return
+
+        data = np.empty((max(2 * capacity, self._end + n), 2))
+        data[:self._end] = self._data[:self._end]
+        self._data = data
+
+    def _maybe_compact(self):
+        if self._end - self._n_used > max(self._n_used, 1024):
+            self.compact()
+
+
+class _BaseModel:
+    type = None
+    dependency_keys = {}  # data key holding a name -> type of that object
+
+    def __init__(self, name, store, n_points):
+        self.name = name
+        self.document = None
+        self._store = store
+        self.block = store.allocate(n_points)
+
+    @property
+    def _points(self):
+        return self._store.view(self.block)
+
+    @property
+    def canvas_coords(self):
+        return self._points.copy()
+
+    @canvas_coords.setter
+    def canvas_coords(self, values):
+        self._points[:] = values
+
+    @property
+    def coords(self):
+        return self.document.map2real(self.canvas_coords)
+
+    def translate(self, delta):
+        self._points[:] += delta
+
+    def release(self):
+        self._store.release(self.block)
+
+
+class PointModel(_BaseModel):
+    type = 'Point'
+
+    def __init__(self, name, store, canvas_coords):
+        super().__init__(name, store, 1)
+        self.canvas_coords = canvas_coords
+
+    @property
+    def canvas_coords(self):
+        return self._points[0].copy()
+
+    @canvas_coords.setter
+    def canvas_coords(self, values):
+        self._points[0] = values
+
+
+class LineModel(_BaseModel):
+    type = 'Line'
+
+    def __init__(self, name, store, canvas_coords):
+        canvas_coords = np.array(canvas_coords, dtype=float).reshape(-1, 2)
+        super().__init__(name, store, canvas_coords.shape[0])
+        self.sliders = []
+        self._vs = None
+        self.canvas_coords = canvas_coords
+
+    @_BaseModel.canvas_coords.setter
+    def canvas_coords(self, values):
+        values = np.asarray(values, dtype=float).reshape(-1, 2)
+        if values.shape[0] != self.n_points:
+            self._store.resize(self.block, values.shape[0])
+
+        self._points[:] = values
+        self._vs = None
+        self._update_sliders()
+
+    @property
+    def n_points(self):
+        return len(self.block)
+
+    @property
+    def vs(self):
+        # normalized cumulative arc length at each point (translation invariant)
+        if self._vs is None:
+            lengths = np.linalg.norm(np.diff(self._points, axis=0), axis=1)
+            vs = np.concatenate([[0.], np.cumsum(lengths)])
+            self._vs = vs / vs[-1]
+
+        return self._vs
+
+    def translate(self, delta):
+        super().translate(delta)
+        self._update_sliders()
+
+    def get_point(self, index):
+        return self._points[index].copy()
+
+    def set_point(self, index, canvas_coords):
+        self._points[index] = canvas_coords
+        self._vs = None
+        self._update_sliders()
+
+    def insert_point(self, index, canvas_coords):
+        self.canvas_coords = np.insert(self._points, index, canvas_coords,
+                                       axis=0)
+
+    def remove_point(self, index):
+        self.canvas_coords = np.delete(self._points, index, axis=0)
+
+    def _update_sliders(self):
+        for slider in self.sliders:
+            slider.refresh()
+
+    def project(self, coords):
+        # closest point on the line, its segment index and v
+        # accepts a single point or an (N, 2) array
+        coords = np.asarray(coords, dtype=float)
+        pts = coords.reshape(-1, 2)
+
+        pt1 = self._points[:-1]
+        t_vecs = np.diff(self._points, axis=0)
+        lengths2 = np.einsum('ij,ij->i', t_vecs, t_vecs)
+
+        rel = pts[:, np.newaxis, :] - pt1
+        s = np.einsum('nij,ij->ni', rel, t_vecs)
+        s = np.divide(s, lengths2, out=np.zeros_like(s), where=lengths2 > 0)
+        s = np.clip(s, 0., 1.)
+
+        projs = pt1 + s[..., np.newaxis] * t_vecs
+        dists2 = np.sum((pts[:, np.newaxis, :] - projs)**2, axis=-1)
+
+        seg_index = np.argmin(dists2, axis=1)  # first segment on ties
+        rows = np.arange(pts.shape[0])
+        closest = projs[rows, seg_index]
+        s = s[rows, seg_index]
+
+        vs = self.vs
+        v = vs[seg_index] + s * (vs[seg_index + 1] - vs[seg_index])
+
+        if coords.ndim == 1:
+            return closest[0], seg_index[0], v[0]
+
+        return closest, seg_index, v
+
+    def find_closest_point(self, coords):
+        return self.project(coords)[0]
+
+    def get_coords_by_v(self, v):
+        # accepts a single v or an array of vs
+        vs = self.vs
+        v = np.asarray(v, dtype=float)
+
+        seg_index = np.clip(np.searchsorted(vs, v) - 1, 0, len(vs) - 2)
+        vlim1 = vs[seg_index]
+        dv = vs[seg_index + 1] - vlim1
+        s = np.divide(v - vlim1, dv, out=np.zeros_like(v), where=dv > 0)
+
+        pt1 = self._points[seg_index]
+        pt2 = self._points[seg_index + 1]
+
+        return pt1 + s[..., np.newaxis] * (pt2 - pt1)
+
+    def get_v(self, coords):
+        # stepwise-linear curve independent variable
+        return self.project(coords)[2]
+
+
+class SliderModel(_BaseModel):
+    type = 'Slider'
+    dependency_keys = {'anchor': 'Line'}
+
+    def __init__(self, name, store, anchor, v_init, v_end, n_points):
+        super().__init__(name, store, n_points)
+        self.anchor = anchor
+        self.anchor.sliders.append(self)
+
+        self._v_init = v_init
+        self._v_end = v_end
+        self.refresh()
+
+    @property
+    def v_init(self):
+        return self._v_init
+
+    @v_init.setter
+    def v_init(self, value):
+        self._v_init = value
+        self.refresh()
+
+    @property
+    def v_end(self):
+        return self._v_end
+
+    @v_end.setter
+    def v_end(self, value):
+        self._v_end = value
+        self.refresh()
+
+    @property
+    def n_points(self):
+        return len(self.block)
+
+    @n_points.setter
+    def n_points(self, value):
+        self._store.resize(self.block, value)
+        self.refresh()
+
+    def refresh(self):
+        # derived from the anchor
+        self._points[:] = self.anchor.get_coords_by_v(self.get_vs())
+
+    def get_vs(self):
+        ts = np.linspace(0., 1., self.n_points)
+        vs = self.v_init + ts * (self.v_end - self.v_init)
+        vs[-1] = self.v_end
+
+        return vs
+
+    def get_point(self, index):
+        return self._points[index].copy()
+
+    def move_master(self, index, canvas_coords):
+        # index 0 moves v_init, any other moves v_end
+        v = self.anchor.project(canvas_coords)[2]
+
+        if index == 0:
+            self.v_init = v
+        else:
+            self.v_end = v
+
+    def detach(self):
+        self.anchor.sliders.remove(self)
+
+
+class Document:
+
+    def __init__(self):
+        self.calibration = None
+        self.store = PointStore()
+        self.objects = {}  # ordered set
+
+    @property
+    def calibrated(self):
+        return self.calibration is not None
+
+    def calibrate(self, canvas_coords, coords):
+        self.calibration = Calibration(canvas_coords, coords)
+        return self.calibration
+
+    def map2real(self, coords):
+        return self.calibration.map2real(coords)
+
+    def map2canvas(self, coords):
+        return self.calibration.map2canvas(coords)
+
+    def set_calibration_point(self, index, canvas_coords=None, coords=None,
+                              keep_real=False):
+        # with keep_real, objects keep their real coordinates
+        scale, offset = self.calibration.scale, self.calibration.offset
+        self.calibration.set_point(index, canvas_coords=canvas_coords,
+                                   coords=coords)
+
+        if keep_real:
+            self._keep_real(scale, offset)
+
+    def set_calibration(self, canvas_coords, coords, keep_real=False):
+        scale, offset = self.calibration.scale, self.calibration.offset
+        self.calibration.canvas_coords = canvas_coords
+        self.calibration.coords = coords
+
+        if keep_real:
+            self._keep_real(scale, offset)
+
+    def _keep_real(self, scale, offset):
+        # one affine map from old to new canvas coordinates for all points
+        new_scale, new_offset = self.calibration.scale, self.calibration.offset
+
+        data = self.store.data
+        data *= scale / new_scale
+        data += (offset - new_offset) / new_scale
+
+        # arc lengths are not kept by non-uniform scaling
+        for model in self.objects:
+            if isinstance(model, LineModel):
+                model._vs = None
+
+        for model in self.objects:
+            if isinstance(model, SliderModel):
+                model.refresh()
+
+    def add_point(self, name, coords):
+        canvas_coords = self.map2canvas(np.array(coords, dtype=float))
+        return self._add(PointModel(name, self.store, canvas_coords))
+
+    def add_line(self, name, coords):
+        canvas_coords = self.map2canvas(np.array(coords, dtype=float))
+        return self._add(LineModel(name, self.store, canvas_coords))
+
+    def add_slider(self, name, anchor, v_init, v_end, n_points):
+        return self._add(SliderModel(name, self.store, anchor, v_init, v_end,
+                                     n_points))
+
+    def _add(self, model):
+        if not self.calibrated:
+            raise Exception('Cannot add objects before calibration')
+
+        model.document = self
+        self.objects[model] = None
+
+        return model
+
+    def remove(self, model):
+        if isinstance(model, SliderModel):
+            model.detach()
+
+        model.release()
+        del self.objects[model]
+        model.document = None
+
+    def clear(self):
+        for model in reversed(list(self.objects)):
+            self.remove(model)
+
+        self.calibration = None
+        self.store = PointStore()
+
+
+def load_document(data):
+    document = Document()
+
+    calibration_info = data.get('calibration', None)
+    if calibration_info is None:
+        return document
+
+    document.calibrate(calibration_info['canvas_coords'],
+                       calibration_info['coords'])
+
+    objects_info = data.get('objects', [])
+    models = {}
+    for obj_info in sort_objects_info(objects_info, TYPE2MODEL):
+        model = _add_model_from_dict(document, obj_info, models)
+        models[model.name] = model
+
+    return document
+
+
+def _add_model_from_dict(document, obj_info, models):
+    obj_type = obj_info['type']
+    name = obj_info['name']
+
+    if obj_type == 'Point':
+        return document.add_point(name, obj_info['coords'])
+    elif obj_type == 'Line':
+        return document.add_line(name, obj_info['coords'])
+    elif obj_type == 'Slider':
+        anchor = models[obj_info['anchor']]
+        return document.add_slider(name, anchor, obj_info['v_init'],
+                                   obj_info['v_end'], obj_info['n_points'])
+
+
+def sort_objects_info(objects_info, type2cls):
+    # each object after the ones it depends on (see dependency_keys),
+    # otherwise in the given order; objects of unknown types are skipped
+    objects_info = [obj_info for obj_info in objects_info
+                    if obj_info.get('type') in type2cls]
+
+    name2info = {}
+    for obj_info in objects_info:
+        if obj_info['name'] in name2info:
+            raise Exception('Name already exists')
+        name2info[obj_info['name']] = obj_info
+
+    sorted_info = []
+    done = {}  # name -> False while its dependencies are being added
+    for obj_info in objects_info:
+        if obj_info['name'] in done:
+            continue
+
+        done[obj_info['name']] = False
+        stack = [(obj_info, _iter_dependencies(obj_info, type2cls))]
+        while stack:
+            info, dependencies = stack[-1]
+            for name, dependency_type in dependencies:
+                if name not in name2info:
+                    raise Exception(
+                        f'Unknown dependency {name} of {info["name"]}')
+                elif name2info[name]['type'] != dependency_type:
+                    raise Exception(f'Dependency {name} of {info["name"]} '
+                                    f'is not a {dependency_type}')
+
+                if name not in done:
+                    done[name] = False
+                    dependency = name2info[name]
+                    stack.append(
+                        (dependency, _iter_dependencies(dependency, type2cls)))
+                    break
+                elif not done[name]:
+                    raise Exception(f'Circular dependency on {name}')
+            else:
+                stack.pop()
+                done[info['name']] = True
+                sorted_info.append(info)
+
+    return sorted_info
+
+
+def _iter_dependencies(obj_info, type2cls):
+    dependency_keys = type2cls[obj_info['type']].dependency_keys
+    for key, dependency_type in dependency_keys.items():
+        name = obj_info.get(key, None)
+        if name is not None:
+            yield name, dependency_type
+
+
+TYPE2MODEL = {
+    'Point': PointModel,
+    'Line': LineModel,
+    'Slider': SliderModel
+}
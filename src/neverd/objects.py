@@ -1,25 +1,31 @@
 
-import json
+import time
 from abc import ABCMeta
+from contextlib import contextmanager
+from functools import partial
 import tkinter as tk
 
 import numpy as np
 from PIL import ImageTk
-from PIL import Image
 
+from neverd.constants import MIDDLE_BUTTON
 from neverd.popups import CanvasPopupMenu
 from neverd.popups import ObjectPopupMenu
 from neverd.popups import LinePopupMenu
 from neverd.popups import SliderPopupMenu
 from neverd.popups import ImagePopupMenu
-from neverd.utils import flatten_list
+from neverd.model import Document
+from neverd.imaging import IMAGE_LOADER
+from neverd.imaging import ImageTiler
+from neverd.imaging import PlaceholderSource
+from neverd.imaging import get_image_size
+from neverd.imaging import open_source
+from neverd.imaging import open_thumbnail
+from neverd.storage import dump_data
 from neverd.utils import get_bound_position
 from neverd.utils import MAP_POS_TO_CURSOR_SYMBOL
 
 
-ATOL = 1e-6
-
-
 # TODO: add mouse position in real world coordinates at bottom (info bar?)
 # TODO: cross-platform bindings
 # TODO: check change of coordinates (sign)
@@ -28,18 +34,40 @@ ATOL = 1e-6
 class GeometricCanvas(tk.Canvas):
     type = 'GeometricCanvas'
 
-    def __init__(self, holder, width=800, height=800, **canvas_kwargs):
+    def __init__(self, holder, width=800, height=800, motion_rate=60,
+                 zoom_step=1.25, **canvas_kwargs):
+        canvas_kwargs.setdefault('confine', False)  # free panning
         super().__init__(holder, width=width, height=height, **canvas_kwargs)
         self.objects = {}
+        self.document = Document()
+        self._names = {}
+        self._types = {}  # dict keys as ordered sets
+
+        self._batch_depth = 0
+        self._dirty = {}
+
+        self.motion_rate = motion_rate  # max handled motions per second
+        self._pending_motions = {}
+        self._motion_job = None
+        self._last_motion_time = 0.
+
+        # view (Tk item) coordinates = canvas coordinates * zoom + offset
+        self.zoom = 1.
+        self.zoom_step = zoom_step
+        self._view_offset = np.zeros(2)
 
         self.calibration_rectangle = None
         self.image = None
+        self.journal = None  # see neverd.journal
+        self.history = None  # see neverd.history
         self._width = width
         self._height = height
 
         self.popup_menu = CanvasPopupMenu(self)
 
         self.bind('<Configure>', self._update_size)
+        self.bind('<ButtonRelease>', self.flush_motions, add='+')
+        self._config_view_bindings()
 
     @property
     def calibrated(self):
@@ -69,24 +97,158 @@ class GeometricCanvas(tk.Canvas):
         self._width = int(event.width) - self._border_width
         self._height = int(event.height) - self._border_width
 
+        if self.image is not None:
+            self.image._redraw()
+
+    def get_viewport(self):
+        # visible region, in view coordinates
+        x0, y0 = self.canvasx(0), self.canvasy(0)
+        return x0, y0, x0 + self.width, y0 + self.height
+
+    def canvas2view(self, coords):
+        return np.asarray(coords, dtype=float) * self.zoom + self._view_offset
+
+    def view2canvas(self, coords):
+        return (np.asarray(coords, dtype=float) - self._view_offset) / self.zoom
+
+    def get_event_coords(self, event):
+        # accounts for panning and zoom
+        return self.view2canvas((self.canvasx(event.x), self.canvasy(event.y)))
+
+    def _config_view_bindings(self):
+        self.bind('<MouseWheel>', self.on_zoom)
+        self.bind('<Button-4>', self.on_zoom)
+        self.bind('<Button-5>', self.on_zoom)
+
+        self.bind(f'<ButtonPress-{MIDDLE_BUTTON}>', self.on_pan_start)
+        self.bind(f'<B{MIDDLE_BUTTON}-Motion>',
+                  self.coalesce_motion(self, self.on_pan))
+
+    def zoom_at(self, factor, x, y):
+        # (x, y) in view coordinates stays still
+        # items are scaled by Tk, only the image is redrawn (lazily resampled)
+        self.scale('all', x, y, factor, factor)
+
+        self.zoom *= factor
+        self._view_offset = (1 - factor) * np.array((x, y)) + factor * self._view_offset
+
+        if self.image is not None:
+            self.image._on_zoom()
+
+    def on_zoom(self, event):
+        zoom_in = event.num == 4 or getattr(event, 'delta', 0) > 0
+        factor = self.zoom_step if zoom_in else 1 / self.zoom_step
+
+        self.zoom_at(factor, self.canvasx(event.x), self.canvasy(event.y))
+
+    def on_pan_start(self, event):
+        self.flush_motions()
+        self.scan_mark(event.x, event.y)
+
+    def on_pan(self, event):
+        self.scan_dragto(event.x, event.y, gain=1)
+
+        if self.image is not None:
+            self.image._redraw()
+
     def has_image(self):
         return self.image is not None
 
     def map2real(self, coords):
-        return self.calibration_rectangle.map2real(coords)
+        return self.document.map2real(coords)
 
     def map2canvas(self, coords):
-        return self.calibration_rectangle.map2canvas(coords)
+        return self.document.map2canvas(coords)
+
+    @contextmanager
+    def batch(self):
+        # redraws are deferred until the outermost batch exits
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush_redraws()
+
+    def request_redraw(self, obj):
+        # redraws are not changes (e.g. zoom, pan), see begin_change
+        if self._batch_depth:
+            self._dirty[obj] = None
+        else:
+            obj._draw()
+
+    def begin_change(self, obj):
+        # before obj is changed (recorded for undo and journaled)
+        if self.history is not None:
+            self.history.record_change(obj.owner)
+
+        self.mark_changed(obj)
+
+    def mark_changed(self, obj):
+        if self.journal is not None:
+            self.journal.mark_changed(obj.owner)
+
+    def _mark_deleted(self, obj):
+        if self.journal is not None:
+            self.journal.mark_deleted(obj)
+
+    def _cancel_redraw(self, obj):
+        self._dirty.pop(obj, None)
+
+    def redraw_objects(self):
+        with self.batch():
+            for obj in self.objects.values():
+                obj.redraw()
+
+    def _flush_redraws(self):
+        dirty, self._dirty = self._dirty, {}
+        for obj in dirty:
+            obj._draw()
+
+    def coalesce_motion(self, key, handler):
+        # event callback keeping only the latest pending motion per key
+        return lambda event: self.post_motion(key, handler, event)
+
+    def post_motion(self, key, handler, event):
+        self._pending_motions[key] = (handler, event)
+        if self._motion_job is not None:
+            return
+
+        delay = 0
+        if self.motion_rate:
+            elapsed = time.perf_counter() - self._last_motion_time
+            delay = max(0, int(1000 * (1 / self.motion_rate - elapsed)))
+
+        if delay:
+            self._motion_job = self.after(delay, self._dispatch_motions)
+        else:
+            self._motion_job = self.after_idle(self._dispatch_motions)
+
+    def flush_motions(self, *args):
+        if self._motion_job is None:
+            return
+
+        self.after_cancel(self._motion_job)
+        self._dispatch_motions()
+
+    def _dispatch_motions(self):
+        self._motion_job = None
+        self._last_motion_time = time.perf_counter()
+
+        pending, self._pending_motions = self._pending_motions, {}
+        with self.batch():
+            for handler, event in pending.values():
+                handler(event)
 
     def get_by_type(self, obj_type):
-        return [obj for obj in self.objects.values() if obj.type == obj_type]
+        return list(self._types.get(obj_type, ()))
 
     def get_by_name(self, name):
-        for obj in self.objects.values():
-            if obj.name == name:
-                return obj
+        return self._names.get(name, None)
 
-        return None
+    def has_name(self, name):
+        return name in self._names
 
     def get_names(self, obj_type=None):
         if obj_type:
@@ -100,20 +262,38 @@ class GeometricCanvas(tk.Canvas):
         if not self.calibrated:
             raise Exception('Cannot add objects before calibration')
 
-        if obj.name == '' or obj.name in self.get_names():
+        if obj.name == '' or self.has_name(obj.name):
             raise Exception('Name already exists')
 
         item_id = obj.create_widget(self)
 
         self.objects[item_id] = obj
+        self._names[obj.name] = obj
+        self._types.setdefault(obj.type, {})[obj] = None
+        self.mark_changed(obj)
+
+        if self.history is not None:
+            self.history.record_added(obj)
 
         if not show:
             obj.hide()
 
     def delete_object(self, id):
-        obj = self.objects[id]
+        if self.history is not None:
+            self.history.record_deleted(self.objects[id])
+
+        obj = self.objects.pop(id)
+        del self._names[obj.name]
+        del self._types[obj.type][obj]
+        self._mark_deleted(obj)
         obj.destroy()
-        del self.objects[id]
+
+    def _rename_object(self, obj, old_name):
+        if self._names.get(old_name, None) is not obj:
+            return
+
+        del self._names[old_name]
+        self._names[obj.name] = obj
 
     def show_all(self):
         for obj in self.objects.values():
@@ -132,12 +312,16 @@ class GeometricCanvas(tk.Canvas):
             allow_edit=allow_edit)
 
         self.calibration_rectangle.create_widget(self)
+        self.mark_changed(self.calibration_rectangle)
 
         if not show:
             self.calibration_rectangle.hide()
 
     def add_image(self, path, upper_left_corner=(0, 0), size=None, show=True,
                   allow_translate=True, allow_edit=True, allow_delete=True):
+        if self.history is not None:
+            self.history.record_image()
+
         self.image = _CanvasImage(path=path, upper_left_corner=upper_left_corner,
                                   size=size, allow_translate=allow_translate,
                                   allow_edit=allow_edit,
@@ -145,12 +329,17 @@ class GeometricCanvas(tk.Canvas):
 
         self.image.create_widget(self)
         self.tag_lower(self.image.id)  # move image back
+        self.mark_changed(self.image)
 
         if not show:
             self.image.hide()
 
     def delete_image(self):
         if self.image is not None:
+            if self.history is not None:
+                self.history.record_image()
+
+            self._mark_deleted(self.image)
             self.image.destroy()
             self.image = None
 
@@ -176,24 +365,41 @@ class GeometricCanvas(tk.Canvas):
         return output_dict
 
     def dump(self, filename):
-        with open(filename, 'w') as file:
-            json.dump(self.as_dict(), file, indent=2)
+        # json or binary (.npz), by extension
+        dump_data(self.as_dict(), filename)
 
     def clear(self):
+        history, self.history = self.history, None  # not undoable
+
         for obj_id in reversed(list(self.objects.keys())):
-            self.delete_object(obj_id)
+            if obj_id in self.objects:  # sliders go with their anchor
+                self.delete_object(obj_id)
 
         self.delete_image()
 
         if self.calibration_rectangle is not None:
+            self._mark_deleted(self.calibration_rectangle)
             self.calibration_rectangle.destroy()
             self.calibration_rectangle = None
 
+        self.document.clear()
+        self._names.clear()
+        self._types.clear()
+
+        if history is not None:
+            history.clear()
+            self.history = history
+
 
 class _BaseCanvasObject(metaclass=ABCMeta):
+    dependency_keys = {}  # data key holding a name -> type of that object
+    history_attributes = ('name', 'text', 'color', 'allow_translate',
+                          'allow_delete', 'allow_edit')  # see update
 
     def __init__(self, name, text, color, allow_translate, allow_delete,
                  allow_edit):
+        self._id = None
+        self.model = None
         self.name = name
         self.text = text
         self._allow_translate = allow_translate and allow_edit
@@ -201,7 +407,19 @@ class _BaseCanvasObject(metaclass=ABCMeta):
         self._allow_edit = allow_edit
         self._color = color
 
-        self._id = None
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        old_name = getattr(self, '_name', None)
+        self._name = value
+        if self.model is not None:
+            self.model.name = value
+
+        if self._id is not None:
+            self.canvas._rename_object(self, old_name)
 
     @property
     def id(self):
@@ -221,14 +439,8 @@ class _BaseCanvasObject(metaclass=ABCMeta):
     def _set_canvas(self, canvas):
         self.canvas = canvas
 
-    @property
-    def canvas_coords(self):
-        canvas_coords = self.canvas.coords(self.id)
-        return canvas_coords
-
-    @canvas_coords.setter
-    def canvas_coords(self, values):
-        self.canvas.coords(self.id, *values)
+    def _destroy_model(self):
+        self.canvas.document.remove(self.model)
 
     @property
     def color(self):
@@ -283,7 +495,8 @@ class _BaseCanvasObject(metaclass=ABCMeta):
 
     def bind_translate(self):
         self.canvas.tag_bind(self.id, '<Button-1>', self.on_config_delta_mov)
-        self.canvas.tag_bind(self.id, '<B1-Motion>', self.on_translate)
+        self.canvas.tag_bind(self.id, '<B1-Motion>',
+                             self.canvas.coalesce_motion(self, self.on_translate))
 
     def unbind_translate(self):
         self.canvas.tag_unbind(self.id, '<Button-1>')
@@ -314,19 +527,36 @@ class _BaseCanvasObject(metaclass=ABCMeta):
         self._create_popup_menu()
 
     def on_translate(self, event):
+        self.canvas.begin_change(self)
         self.canvas_coords = self._click_coords + self._get_delta_mov(event)
 
     def on_config_delta_mov(self, event):
-        self._click_mouse_coords = event.x, event.y
+        self.canvas.flush_motions()
+        self._click_mouse_coords = self.canvas.get_event_coords(event)
         self._click_coords = self.canvas_coords
 
     def _get_delta_mov(self, event):
-        return np.array((event.x - self._click_mouse_coords[0],
-                         event.y - self._click_mouse_coords[1]))
+        return self.canvas.get_event_coords(event) - self._click_mouse_coords
 
     def destroy(self):
         self._destroy_popup_menu()
+        self.canvas._cancel_redraw(self)
         self.canvas.delete(self.id)
+        self._destroy_model()
+
+    @property
+    def owner(self):
+        # object saved with the project
+        return self
+
+    def redraw(self):
+        self._redraw()
+
+    def _redraw(self):
+        self.canvas.request_redraw(self)
+
+    def _draw(self):
+        pass
 
     def _create_popup_menu(self):
         self.popup_menu = ObjectPopupMenu(self)
@@ -357,8 +587,17 @@ class _BaseCanvasObject(metaclass=ABCMeta):
 
         return self._clean_data_dict(data)
 
+    def get_geometry(self):
+        # canvas coordinates (copy) restored by undo, if not attributes
+        return None
+
+    def set_geometry(self, values):
+        pass
+
     def update(self, name=None, text=None, color=None, allow_translate=None,
                allow_delete=None, allow_edit=None):
+        self.canvas.begin_change(self)
+
         if name is not None:
             self.name = name
 
@@ -382,37 +621,52 @@ class _BaseCanvasObject(metaclass=ABCMeta):
 
 
 class _CompositeBaseObject(_BaseCanvasObject, metaclass=ABCMeta):
+    history_attributes = _BaseCanvasObject.history_attributes + ('width',
+                                                                 'size')
 
     def __init__(self, name, text, color, allow_translate, allow_delete,
                  allow_edit, width=1):
         super().__init__(name, text, color, allow_translate, allow_delete,
                          allow_edit)
-        self._init_width = width
+        self._width = width
 
     @property
     def coords(self):
-        return np.array([point.coords for point in self.points])
+        return self.model.coords
 
     @coords.setter
     def coords(self, values):
-        for point, new_coords in zip(self.points, values):
-            point.coords = new_coords
+        self.canvas_coords = self.canvas.map2canvas(np.array(values))
 
     @property
     def canvas_coords(self):
-        return np.array([point.canvas_coords for point in self.points])
+        return self.model.canvas_coords
 
     @canvas_coords.setter
     def canvas_coords(self, values):
-        for point, new_coords in zip(self.points, values):
-            point.canvas_coords = new_coords
+        with self.canvas.batch():
+            self.model.canvas_coords = values
+            self.redraw()
+
+    def get_geometry(self):
+        return self.canvas_coords
+
+    def set_geometry(self, values):
+        self.canvas_coords = values
+
+    def redraw(self):
+        with self.canvas.batch():
+            for point in self.points:
+                point._redraw()
+            self.update_coords()
 
     @property
     def width(self):
-        return int(float(self.canvas.itemcget(self.id, 'width')))
+        return self._width
 
     @width.setter
     def width(self, value):
+        self._width = value
         self.canvas.itemconfigure(self.id, width=value)
 
     @_BaseCanvasObject.color.setter
@@ -457,21 +711,26 @@ class _CompositeBaseObject(_BaseCanvasObject, metaclass=ABCMeta):
         for point in self.points:
             point.create_widget(canvas)
 
+    def _index_points(self):
+        for index, point in enumerate(self.points):
+            point.index = index
+
     def update(self, name=None, coords=None, color=None, width=None, size=None,
                small_size=None, text=None, allow_translate=None, allow_delete=None,
                allow_edit=None):
-        super().update(name=name, text=text, color=color,
-                       allow_translate=allow_translate,
-                       allow_delete=allow_delete, allow_edit=allow_edit)
+        with self.canvas.batch():
+            super().update(name=name, text=text, color=color,
+                           allow_translate=allow_translate,
+                           allow_delete=allow_delete, allow_edit=allow_edit)
 
-        if width is not None:
-            self.width = width
+            if width is not None:
+                self.width = width
 
-        if size is not None:
-            self.size = size
+            if size is not None:
+                self.size = size
 
-        if coords is not None:
-            self.coords = coords
+            if coords is not None:
+                self.coords = coords
 
     def as_dict(self):
         data = super().as_dict()
@@ -485,6 +744,8 @@ class _CompositeBaseObject(_BaseCanvasObject, metaclass=ABCMeta):
 
 class _CalibrationRectangle(_CompositeBaseObject):
     type = 'CalibrationRectangle'
+    history_attributes = ('color', 'width', 'size', 'keep_real',
+                          'allow_translate', 'allow_edit')
 
     def __init__(self, canvas_coords, coords, width=2, size=8,
                  color='black', keep_real=False, allow_translate=True,
@@ -492,11 +753,11 @@ class _CalibrationRectangle(_CompositeBaseObject):
         super().__init__(None, None, color, width=width,
                          allow_translate=allow_translate, allow_delete=False,
                          allow_edit=allow_edit)
-        self._pt1 = _MasterCalibrationPoint(self, canvas_coords[0], coords[0],
-                                            color=color, size=size,
+        self._init_canvas_coords = canvas_coords
+        self._init_coords = coords
+        self._pt1 = _MasterCalibrationPoint(self, 0, color=color, size=size,
                                             allow_translate=allow_edit)
-        self._pt2 = _MasterCalibrationPoint(self, canvas_coords[1], coords[1],
-                                            color=color, size=size,
+        self._pt2 = _MasterCalibrationPoint(self, 1, color=color, size=size,
                                             allow_translate=allow_edit)
         self.keep_real = keep_real
         self._min_dist = 2
@@ -512,71 +773,66 @@ class _CalibrationRectangle(_CompositeBaseObject):
     def points(self):
         return [self._pt1, self._pt2]
 
+    @_CompositeBaseObject.coords.setter
+    def coords(self, values):
+        with self.canvas.batch():
+            for point, new_coords in zip(self.points, values):
+                point.coords = new_coords
+
+    @_CompositeBaseObject.canvas_coords.setter
+    def canvas_coords(self, values):
+        with self.canvas.batch():
+            for point, new_coords in zip(self.points, values):
+                point.canvas_coords = new_coords
+
     def create_widget(self, canvas):
         self.canvas = canvas
+        self.model = canvas.document.calibrate(self._init_canvas_coords,
+                                               self._init_coords)
 
         # create rectangle
-        pt_top_left, pt_bottom_right = self._get_corners()
-        self.id = self.canvas.create_rectangle(*pt_top_left.canvas_coords,
-                                               *pt_bottom_right.canvas_coords,
+        self.id = self.canvas.create_rectangle(*self._get_view_corners(),
                                                outline=self.color,
-                                               width=self._init_width)
+                                               width=self._width)
         # create points
         self._create_points(canvas)
 
-    def _get_corners(self):
-        # alternative is to modify mapping functions
-        pt1_position = self._pt1.position
-        pt2_position = self._pt2.position
-
-        if pt1_position == 'top_left' and pt2_position == 'bottom_right':
-            return self._pt1, self._pt2
-        elif pt1_position == 'bottom_right' and pt2_position == 'top_left':
-            return self._pt2, self._pt1
-        elif (pt1_position == 'bottom_left' and pt2_position == 'top_right') or pt1_position == 'top_right' and pt2_position == 'bottom_left':
-            if (pt1_position == 'bottom_left' and pt2_position == 'top_right'):
-                pt_bottom_left, pt_top_right = self._pt1, self._pt2
-            else:
-                pt_bottom_left, pt_top_right = self._pt2, self._pt1
-
-            # pt top left
-            canvas_coords = (pt_bottom_left.canvas_coords[0],
-                             pt_top_right.canvas_coords[1])
-            coords = (pt_bottom_left.coords[0],
-                      pt_top_right.coords[1])
-            pt_top_left = _CalibrationPoint(canvas_coords, coords)
+    def _destroy_model(self):
+        pass
 
-            # pt bottom right
-            canvas_coords = (pt_top_right.canvas_coords[0],
-                             pt_bottom_left.canvas_coords[1])
-            coords = (pt_top_right.coords[0],
-                      pt_bottom_left.coords[1])
-            pt_bottom_right = _CalibrationPoint(canvas_coords, coords)
+    def get_geometry(self):
+        # real coordinates included
+        return np.concatenate([self.model.canvas_coords, self.model.coords])
 
-            return pt_top_left, pt_bottom_right
+    def set_geometry(self, values):
+        with self.canvas.batch():
+            self.canvas.document.set_calibration(
+                values[:2], values[2:], keep_real=self.keep_real)
+            self.redraw()
 
-    def map2real(self, coords):
-        pt_top_left, pt_bottom_right = self._get_corners()
+            if self.keep_real:
+                self.canvas.redraw_objects()
 
-        canvas_diff, real_diff = pt_bottom_right - pt_top_left
-        u = (coords - pt_top_left.canvas_coords) / canvas_diff
+    def _get_corners(self):
+        return self.model.get_corners()
 
-        return real_diff * u * np.array([1, 1]) + pt_top_left.coords
+    def map2real(self, coords):
+        return self.model.map2real(coords)
 
     def map2canvas(self, coords):
-        pt_top_left, pt_bottom_right = self._get_corners()
-
-        canvas_diff, real_diff = pt_bottom_right - pt_top_left
-        u = (coords - pt_top_left.coords) / real_diff
-
-        return canvas_diff * u + pt_top_left.canvas_coords
+        return self.model.map2canvas(coords)
 
     def update_coords(self):
         # when master points are updated
-        pt_top_left, pt_bottom_right = self._get_corners()
+        self._redraw()
 
-        self.canvas.coords(self.id, *pt_top_left.canvas_coords,
-                           *pt_bottom_right.canvas_coords)
+    def _draw(self):
+        self.canvas.coords(self.id, *self._get_view_corners())
+
+    def _get_view_corners(self):
+        pt_top_left, pt_bottom_right = self._get_corners()
+        return (*self.canvas.canvas2view(pt_top_left.canvas_coords),
+                *self.canvas.canvas2view(pt_bottom_right.canvas_coords))
 
     def bind_translate(self):
         super().bind_translate()
@@ -592,16 +848,19 @@ class _CalibrationRectangle(_CompositeBaseObject):
                width=None, size=None, keep_real=None, allow_translate=None,
                allow_delete=None, allow_edit=None):
 
+        self.canvas.begin_change(self)
+
         if keep_real is not None:
             self.keep_real = keep_real
 
-        super().update(name=name, coords=coords, color=color, width=width,
-                       size=size,
-                       allow_translate=allow_translate, allow_delete=allow_delete,
-                       allow_edit=allow_edit)
+        with self.canvas.batch():
+            super().update(name=name, coords=coords, color=color, width=width,
+                           size=size,
+                           allow_translate=allow_translate,
+                           allow_delete=allow_delete, allow_edit=allow_edit)
 
-        if canvas_coords is not None:
-            self.canvas_coords = np.array(canvas_coords)
+            if canvas_coords is not None:
+                self.canvas_coords = np.array(canvas_coords)
 
     def as_dict(self):
         data = super().as_dict()
@@ -617,6 +876,9 @@ class _CalibrationRectangle(_CompositeBaseObject):
 
 class _CanvasImage(_BaseCanvasObject):
     type = 'CanvasImage'
+    history_attributes = ('path', 'upper_left_corner', 'size',
+                          'allow_translate', 'allow_delete', 'allow_edit')
+    load_poll_time = 50  # ms
     # TODO: keep ratio -> Ctrl-Motion
     # TODO: enlarge from center -> Shift-Ctrl-Motion
     # TODO: make current size appear near the mouse when changing size?
@@ -628,11 +890,81 @@ class _CanvasImage(_BaseCanvasObject):
         super().__init__(None, None, None, allow_translate=allow_translate,
                          allow_delete=allow_delete, allow_edit=allow_edit)
         self._init_path = path
-        self._init_upper_left_corner = upper_left_corner
+        self._upper_left_corner = [float(value) for value in upper_left_corner]
         self._init_size = size
 
-        self._image = None
-        self._photo_image = None
+        self._size = None
+        self._tiler = None
+        self._tiles = {}  # index -> (item id, photo image)
+        self._state = 'normal'
+        self._needs_render = False
+        self._live = False
+        self._render_job = None
+        self._load = None  # future of the source being loaded
+        self._load_job = None
+
+    @property
+    def canvas_coords(self):
+        return list(self._upper_left_corner)
+
+    @canvas_coords.setter
+    def canvas_coords(self, values):
+        self._upper_left_corner = [float(value) for value in values]
+        self._redraw()
+
+    def _draw(self):
+        # only the tiles covering the viewport are kept in the canvas
+        x, y = self.canvas.canvas2view(self._upper_left_corner)
+        view_size = self._get_view_size()
+        x0, y0, x1, y1 = self.canvas.get_viewport()
+        indices = self._tiler.get_tile_indices(view_size,
+                                               (x0 - x, y0 - y, x1 - x, y1 - y))
+
+        for index in set(self._tiles).difference(indices):
+            self.canvas.delete(self._tiles.pop(index)[0])
+
+        created = False
+        for index in indices:
+            box = self._tiler.get_tile_box(view_size, index)
+            item_id, photo_image = self._tiles.get(index, (None, None))
+
+            if photo_image is None or self._needs_render:
+                tile = self._tiler.get_tile(view_size, index, live=self._live)
+                photo_image = ImageTk.PhotoImage(tile)
+
+            if item_id is None:
+                item_id = self.canvas.create_image(
+                    x + box[0], y + box[1], image=photo_image, anchor='nw',
+                    state=self._state, tags=(self.id,))
+                created = True
+            else:
+                self.canvas.coords(item_id, x + box[0], y + box[1])
+                self.canvas.itemconfig(item_id, image=photo_image)
+
+            self._tiles[index] = (item_id, photo_image)
+
+        self._needs_render = False
+        if created:
+            self.canvas.tag_lower(self.id)
+
+    def _get_view_size(self):
+        zoom = self.canvas.zoom
+        return (max(int(round(self._size[0] * zoom)), 1),
+                max(int(round(self._size[1] * zoom)), 1))
+
+    def _on_zoom(self):
+        # fast tiles while zooming, full quality once it stops
+        self._live = True
+        self._needs_render = True
+        self._redraw()
+
+        if self._render_job is not None:
+            self.canvas.after_cancel(self._render_job)
+        self._render_job = self.canvas.after(250, self._render)
+
+    def _render(self):
+        self._render_job = None
+        self._resize(self._size, live=False)
 
     @property
     def upper_left_corner(self):
@@ -644,25 +976,79 @@ class _CanvasImage(_BaseCanvasObject):
 
     @property
     def size(self):
-        return self._image.size
+        return self._size
 
     @size.setter
     def size(self, value):
-        self._photo_image = self._get_photo_image(value)
-        self.canvas.itemconfig(self.id, image=self._photo_image)
+        self._resize(value, live=False)
+
+    def _resize(self, size, live):
+        # live sizes are approximate (see on_release_resize)
+        self._size = (int(size[0]), int(size[1]))
+        self._live = live
+        self._needs_render = True
+        self._redraw()
+
+        if not live:
+            self._update_resolution()
 
     @property
     def path(self):
-        return self._original_image.filename
+        return self._path
 
     @path.setter
     def path(self, value):
         if self.path == value:
             return
 
-        self._original_image = Image.open(value)
-        self._photo_image = self._get_photo_image(self.size)
-        self.canvas.itemconfig(self.id, image=self._photo_image)
+        self._set_source(value)
+        self._needs_render = True
+        self._redraw()
+
+    def _set_source(self, path):
+        # resampled tiles are cached by source key, size and filter
+        # (memory-mapped sources are only read where tiles are rendered)
+        self._path = path
+        self._cancel_load()
+
+        # a thumbnail or placeholder is shown while decoding in the background
+        source = (open_source(path, decode=False) or open_thumbnail(path)
+                  or PlaceholderSource(get_image_size(path)))
+        self._tiler = ImageTiler(source)
+        self._update_resolution()
+
+    def _update_resolution(self):
+        # full resolution is only decoded when displayed large enough
+        view_size = self._get_view_size()
+        if self._load is not None or self._tiler.source.covers(view_size):
+            return
+
+        x, y = self.canvas.canvas2view(self._upper_left_corner)
+        x0, y0, x1, y1 = self.canvas.get_viewport()
+        self._load = IMAGE_LOADER.submit(self._path, view_size,
+                                         (x0 - x, y0 - y, x1 - x, y1 - y))
+        self._poll_load()
+
+    def _poll_load(self):
+        if not self._load.done():
+            self._load_job = self.canvas.after(self.load_poll_time,
+                                               self._poll_load)
+            return
+
+        load, self._load, self._load_job = self._load, None, None
+        self._tiler = load.result()
+        self._needs_render = True
+        self._redraw()
+        self._update_resolution()  # e.g. zoomed in meanwhile
+
+    def _cancel_load(self):
+        # a replaced image is not swapped in (its decoding may still finish)
+        if self._load is None:
+            return
+
+        self._load.cancel()
+        self.canvas.after_cancel(self._load_job)
+        self._load = self._load_job = None
 
     def _config_bindings(self):
         super()._config_bindings()
@@ -675,7 +1061,8 @@ class _CanvasImage(_BaseCanvasObject):
         self.canvas.tag_bind(self.id, '<Control-1>', self.on_config_delta_mov)
         self.canvas.tag_bind(self.id, '<Control-1>',
                              self.on_config_cursor_translate, add='+')
-        self.canvas.tag_bind(self.id, '<Control-B1-Motion>', self.on_translate)
+        self.canvas.tag_bind(self.id, '<Control-B1-Motion>',
+                             self.canvas.coalesce_motion(self, self.on_translate))
         self.canvas.tag_bind(self.id, '<ButtonRelease-1>', self.on_reset_cursor)
 
     def unbind_translate(self):
@@ -684,7 +1071,8 @@ class _CanvasImage(_BaseCanvasObject):
         self.canvas.tag_unbind(self.id, '<ButtonRelease-1>')
 
     def _bind_resize_config(self):
-        self.canvas.tag_bind(self.id, '<Motion>', self.on_config_resize)
+        self.canvas.tag_bind(self.id, '<Motion>',
+                             self.canvas.coalesce_motion(self, self.on_config_resize))
 
     def _unbind_resize_config(self):
         self.canvas.tag_unbind(self.id, '<Motion>')
@@ -702,21 +1090,39 @@ class _CanvasImage(_BaseCanvasObject):
         self.canvas.tag_unbind(self.id, '<B1-Motion>')
         self.on_reset_cursor()
 
-    def _get_photo_image(self, size):
-        self._image = self._original_image
-        if size is not None:
-            self._image = self._original_image.resize(size)
-
-        return ImageTk.PhotoImage(self._image)
-
     def create_widget(self, canvas):
         super().create_widget(canvas)
 
-        self._original_image = Image.open(self._init_path)
+        size = self._init_size or get_image_size(self._init_path)
+        self._size = (int(size[0]), int(size[1]))
 
-        self._photo_image = self._get_photo_image(self._init_size)
-        self.id = self.canvas.create_image(*self._init_upper_left_corner,
-                                           image=self._photo_image, anchor='nw')
+        # tag shared by all the tiles
+        self.id = f'image{id(self)}'
+        self._set_source(self._init_path)
+        self._draw()
+
+    def hide(self):
+        self._state = 'hidden'
+        super().hide()
+
+    def show(self):
+        self._state = 'normal'
+        super().show()
+
+    def _get_view_bbox(self):
+        x, y = self.canvas.canvas2view(self._upper_left_corner)
+        width, height = self._get_view_size()
+        return x, y, x + width, y + height
+
+    def destroy(self):
+        if self._render_job is not None:
+            self.canvas.after_cancel(self._render_job)
+        self._cancel_load()
+
+        super().destroy()
+
+    def _destroy_model(self):
+        pass
 
     def _create_popup_menu(self):
         self.popup_menu = ImagePopupMenu(self)
@@ -736,20 +1142,26 @@ class _CanvasImage(_BaseCanvasObject):
     def on_config_resize(self, event):
         tol = 10
 
-        position = get_bound_position(self.canvas, self.id, event.x, event.y,
-                                      tol=tol)
+        position = get_bound_position(self.canvas, self.id,
+                                      self.canvas.canvasx(event.x),
+                                      self.canvas.canvasy(event.y),
+                                      tol=tol, bbox=self._get_view_bbox())
         if position is not None:
             self.on_config_delta_mov(event)  # avoid resize bug
             self.canvas.tag_bind(self.id, '<1>', self.on_config_delta_mov)
             self._config_cursor_bound(position)
 
+            on_resize = partial(self._on_resize, position=position)
             self.canvas.tag_bind(self.id, '<B1-Motion>',
-                                 lambda event, pos=position: self._on_resize(event, pos))
+                                 self.canvas.coalesce_motion(self, on_resize))
+            self.canvas.tag_bind(self.id, '<ButtonRelease-1>',
+                                 self.on_release_resize)
 
         else:
             self._unbind_resize()
 
     def _on_resize(self, event, position):
+        self.canvas.begin_change(self)
         map_pos_to_zero_index = {'left': 1, 'right': 1, 'top': 0, 'bottom': 0}
 
         delta = self._get_delta_mov(event)
@@ -763,8 +1175,9 @@ class _CanvasImage(_BaseCanvasObject):
         if 'top' in position:
             delta[1] *= -1
 
-        previous_size = self._image.size
-        self.size = (previous_size[0] + delta[0], previous_size[1] + delta[1])
+        previous_size = self._size
+        self._resize((previous_size[0] + delta[0],
+                      previous_size[1] + delta[1]), live=True)
 
         self.on_config_delta_mov(event)
 
@@ -780,6 +1193,14 @@ class _CanvasImage(_BaseCanvasObject):
             self.canvas_coords = (previous_coords[0] - delta[0],
                                   previous_coords[1] - delta[1])
 
+    def on_release_resize(self, *args):
+        self.canvas.flush_motions()
+        self.on_reset_cursor()
+
+        # high-quality render from the original
+        if self._live:
+            self.size = self._size
+
     def update(self, allow_translate=None, allow_delete=None, allow_edit=None,
                path=None, upper_left_corner=None, size=None,):
         super().update(allow_translate=allow_translate,
@@ -809,72 +1230,75 @@ class _CanvasImage(_BaseCanvasObject):
 
 class Point(_BaseCanvasObject):
     type = 'Point'
+    history_attributes = _BaseCanvasObject.history_attributes + ('size', )
 
     def __init__(self, name, coords, color='blue', size=5, text='',
                  allow_translate=True, allow_delete=True, allow_edit=True):
         super().__init__(name, text, color, allow_translate, allow_delete,
                          allow_edit)
         self._init_coords = coords
-        self._init_size = size
+        self._size = size
 
     def __sub__(self, other):
         return self.canvas_coords - other.canvas_coords
 
     @property
     def size(self):
-        x1, _, x2, _ = self.canvas.coords(self.id)
-        return round((x2 - x1)) / 2
+        return self._size
 
     @size.setter
     def size(self, value):
-        coords = self.canvas_coords
-
-        (x0, y0), (x1, y1) = self._get_rect_corners(coords, value)
-        self.canvas.coords(self.id, x0, y0, x1, y1)
+        self._size = value
+        self._redraw()
 
     @property
     def coords(self):
         return np.array(self.canvas.map2real(self.canvas_coords))
 
-    @coords.setter
-    def coords(self, values):
-        self.canvas_coords = self.canvas.map2canvas(np.array(values))
-
     @coords.setter
     def coords(self, coords):
-        self.canvas_coords = self.canvas.map2canvas(coords)
+        self.canvas_coords = self.canvas.map2canvas(np.array(coords))
 
     @property
     def canvas_coords(self):
-        x, y, *_ = self.canvas.coords(self.id)
-        return np.array([x, y]) + self.size
+        return self.model.canvas_coords
 
     @canvas_coords.setter
     def canvas_coords(self, center_coords):
-        size = self.size
+        self.model.canvas_coords = center_coords
+        self._redraw()
+
+    def get_geometry(self):
+        return self.canvas_coords
 
-        x1, y1 = center_coords - size
-        x2, y2 = center_coords + size
-        self.canvas.coords(self.id, [x1, y1, x2, y2])
+    def set_geometry(self, values):
+        self.canvas_coords = values
+
+    def _draw(self):
+        (x0, y0), (x1, y1) = self._get_rect_corners(self.canvas_coords,
+                                                    self.size)
+        self.canvas.coords(self.id, x0, y0, x1, y1)
 
     def _get_rect_corners(self, coords, size):
-        # in canvas coordinates
-        x, y = coords
+        # in view coordinates
+        x, y = self.canvas.canvas2view(coords)
 
-        r = size
+        r = size * self.canvas.zoom
         x0, y0 = x - r, y - r
         x1, y1 = x + r, y + r
 
         return (x0, y0), (x1, y1)
 
-    def _get_init_coords(self):
-        return self.canvas.map2canvas(self._init_coords)
+    def _create_model(self):
+        self.model = self.canvas.document.add_point(self.name,
+                                                    self._init_coords)
 
     def create_widget(self, canvas):
         super().create_widget(canvas)
+        self._create_model()
 
-        (x0, y0), (x1, y1) = self._get_rect_corners(self._get_init_coords(),
-                                                    self._init_size)
+        (x0, y0), (x1, y1) = self._get_rect_corners(self.canvas_coords,
+                                                    self.size)
 
         self.id = self.canvas.create_oval(
             x0, y0, x1, y1, fill=self.color, outline="")
@@ -883,14 +1307,15 @@ class Point(_BaseCanvasObject):
 
     def update(self, name=None, coords=None, color=None, size=None, text=None,
                allow_translate=None, allow_delete=None, allow_edit=None):
-        super().update(name, text, color, allow_translate, allow_delete,
-                       allow_edit)
+        with self.canvas.batch():
+            super().update(name, text, color, allow_translate, allow_delete,
+                           allow_edit)
 
-        if size is not None:
-            self.size = size
+            if size is not None:
+                self.size = size
 
-        if coords is not None:
-            self.coords = coords
+            if coords is not None:
+                self.coords = coords
 
     def as_dict(self):
         data = super().as_dict()
@@ -902,12 +1327,18 @@ class Point(_BaseCanvasObject):
 
 
 class _DependentPoint(Point, metaclass=ABCMeta):
+    # geometry is owned by the master's model
 
     def __init__(self, master, name, coords, color='blue', size=5,
                  allow_translate=True):
         super().__init__(name, coords, color=color, size=size, text=None,
                          allow_translate=allow_translate)
         self.master = master
+        self.index = None
+
+    @property
+    def owner(self):
+        return self.master.owner
 
     @property
     def popup_menu(self):
@@ -920,121 +1351,65 @@ class _DependentPoint(Point, metaclass=ABCMeta):
     def _destroy_popup_menu(self):
         pass
 
+    def _create_model(self):
+        pass
 
-class _CalibrationPoint:
-
-    def __init__(self, canvas_coords, coords):
-        self._canvas_coords = np.array(canvas_coords)
-        self._coords = np.array(coords)
-
-    def __sub__(self, other):
-        canvas_diff = self.canvas_coords - other.canvas_coords
-        real_diff = self.coords - other.coords
-
-        return canvas_diff, real_diff
-
-    @property
-    def canvas_coords(self):
-        return self._canvas_coords
-
-    @property
-    def coords(self):
-        return self._coords
+    def _destroy_model(self):
+        pass
 
 
-class _MasterCalibrationPoint(_DependentPoint, _CalibrationPoint):
+class _MasterCalibrationPoint(_DependentPoint):
     # TODO: use 2 lines instead of a point?
 
-    def __init__(self, calibration_rectangle, canvas_coords, coords,
-                 keep_real=False, color='green', size=5, allow_translate=True):
-        _DependentPoint.__init__(self, calibration_rectangle, None, None,
-                                 color=color, size=size,
-                                 allow_translate=allow_translate)
-        _CalibrationPoint.__init__(self, canvas_coords, coords)
-
-    def __sub__(self, other):
-        return _CalibrationPoint.__sub__(self, other)
+    def __init__(self, calibration_rectangle, index, color='green', size=5,
+                 allow_translate=True):
+        super().__init__(calibration_rectangle, None, None, color=color,
+                         size=size, allow_translate=allow_translate)
+        self.index = index
 
     @property
     def coords(self):
-        return self._coords
+        return self.master.model.coords[self.index]
 
     @coords.setter
     def coords(self, center_coords):
+        self.canvas.document.set_calibration_point(
+            self.index, coords=center_coords, keep_real=self.master.keep_real)
 
-        # collect previous coords
-        if self.master.keep_real:
-            previous_coords = self._collect_previous_obj_coords()
-
-        # update calibration
-        self._coords = np.array(center_coords)
-
-        # update coords
         if self.master.keep_real:
-            self._update_obj_coords(previous_coords)
+            self.canvas.redraw_objects()
 
     @property
     def canvas_coords(self):
-        return self._canvas_coords
+        return self.master.model.canvas_coords[self.index]
 
     @canvas_coords.setter
     def canvas_coords(self, center_coords):
-        pt1, pt2 = self.master.points
-        other = pt2 if self is pt1 else pt1
-        diff = np.abs(center_coords - other.canvas_coords)
+        other_canvas_coords = self.master.model.canvas_coords[1 - self.index]
+        diff = np.abs(center_coords - other_canvas_coords)
         if np.any(diff < self.master._min_dist):
             return
 
-        # collect previous coords
-        if self.master.keep_real:
-            previous_coords = self._collect_previous_obj_coords()
-
-        # update calibration
-        self._canvas_coords = np.array(center_coords)
-        Point.canvas_coords.__set__(self, center_coords)
-        self.master.update_coords()
+        with self.canvas.batch():
+            self.canvas.document.set_calibration_point(
+                self.index, canvas_coords=center_coords,
+                keep_real=self.master.keep_real)
+            self._redraw()
+            self.master.update_coords()
 
-        # update coords
-        if self.master.keep_real:
-            self._update_obj_coords(previous_coords)
-
-    def _get_init_coords(self):
-        return self._canvas_coords
-
-    def _collect_previous_obj_coords(self):
-        coords = []
-        for obj in self.canvas.objects.values():  # assumes dict is ordered
-            coords.append(obj.coords)
-
-        return coords
-
-    def _update_obj_coords(self, coords):
-        for obj, coords in zip(self.canvas.objects.values(), coords):
-            obj.update(coords=coords)
+            if self.master.keep_real:
+                self.canvas.redraw_objects()
 
     @property
     def position(self):
-        pt1, pt2 = self.master.points
-        other = pt2 if self is pt1 else pt1
-
-        if self.canvas_coords[0] < other.canvas_coords[0]:
-            if self.canvas_coords[1] < other.canvas_coords[1]:
-                return 'top_left'
-            else:
-                return 'bottom_left'
-
-        else:
-            if self.canvas_coords[1] < other.canvas_coords[1]:
-                return 'top_right'
-            else:
-                return 'bottom_right'
+        return self.master.model.get_position(self.index)
 
 
 class _LinePoint(_DependentPoint):
 
-    def __init__(self, line, coords, color='blue', size=5, allow_translate=True,
+    def __init__(self, line, color='blue', size=5, allow_translate=True,
                  allow_edit=True):
-        super().__init__(line, None, coords, color=color, size=size,
+        super().__init__(line, None, None, color=color, size=size,
                          allow_translate=allow_translate)
 
     @property
@@ -1044,70 +1419,52 @@ class _LinePoint(_DependentPoint):
     def _set_canvas(self, *args):
         pass
 
-    @Point.canvas_coords.setter
+    @property
+    def canvas_coords(self):
+        return self.master.model.get_point(self.index)
+
+    @canvas_coords.setter
     def canvas_coords(self, center_coords):
-        super(_LinePoint, type(self)).canvas_coords.fset(self, center_coords)
-        self.master.update_coords()
+        with self.canvas.batch():
+            self.master.model.set_point(self.index, center_coords)
+            self._redraw()
+            self.master.update_coords()
 
 
 class _MasterSliderPoint(_LinePoint):
 
-    def __init__(self, slider, v, color='blue', size=5, allow_translate=True):
-        super().__init__(slider, None, color=color, size=size,
-                         allow_translate=allow_translate)
-        self.v = v
-
-    def _get_init_coords(self):
-        return self.master.anchor.get_coords_by_v(self.v)
+    @property
+    def v(self):
+        return self.master.model.v_init if self.index == 0 else self.master.model.v_end
 
     @_LinePoint.canvas_coords.setter
     def canvas_coords(self, center_coords):
-        center_coords_ = self.master.anchor.find_closest_point(center_coords)
-        self.v = self.master.anchor.get_v(center_coords_)
-        super(_MasterSliderPoint, type(self)).canvas_coords.fset(self, center_coords_)
-
-    def update_coords(self):
-        # when line changes, to keep v
-        self.canvas_coords = self.master.anchor.get_coords_by_v(self.v)
+        with self.canvas.batch():
+            self.master.model.move_master(self.index, center_coords)
+            self.master.update_coords()
 
 
 class _SlaveSliderPoint(_LinePoint):
 
-    def __init__(self, slider, t, color='blue', size=5):
-        super().__init__(slider, None, color=color, size=size,
+    def __init__(self, slider, color='blue', size=5):
+        super().__init__(slider, color=color, size=size,
                          allow_translate=False)
-        self._t = t
-
-    def _get_init_coords(self):
-        return self.master.anchor.get_coords_by_v(self.v)
-
-    @property
-    def t(self):
-        return self._t
-
-    @t.setter
-    def t(self, value):
-        self._t = value
-        self.canvas_coords = self.canvas_coords  # beautiful
-        self.master.update_coords()
 
     @property
     def v(self):
-        return self.master.master_pts[0].v + self.t * (self.master.master_pts[1].v - self.master.master_pts[0].v)
+        return self.master.model.get_vs()[self.index]
 
-    @property
-    def canvas_coords(self):
-        return self.master.anchor.get_coords_by_v(self.v)
-
-    @canvas_coords.setter
+    @_LinePoint.canvas_coords.setter
     def canvas_coords(self, center_coords):
         if not np.allclose(center_coords, self.canvas_coords):
             raise Exception('Invalid center coords.')
 
-        super(_LinePoint, type(self)).canvas_coords.fset(self, center_coords)
+        self._redraw()
 
 
 class _AbstractLine(_CompositeBaseObject, metaclass=ABCMeta):
+    history_attributes = _CompositeBaseObject.history_attributes + (
+        'small_size', )
 
     def __init__(self, name, points, width=1, color='red', text='',
                  allow_translate=True, allow_delete=True, allow_edit=True):
@@ -1145,11 +1502,13 @@ class _AbstractLine(_CompositeBaseObject, metaclass=ABCMeta):
 
     def create_widget(self, canvas):
         self.canvas = canvas
+        self._create_model()
+        self._index_points()
 
         # create line
-        coords = [point._get_init_coords() for point in self.points]
         self.id = self.canvas.create_line(
-            flatten_list(coords), fill=self.color, width=self._init_width)
+            self.canvas.canvas2view(self.canvas_coords).ravel().tolist(),
+            fill=self.color, width=self._width)
 
         # create points (order matters for bindings)
         self._create_points(canvas)
@@ -1169,111 +1528,20 @@ class _AbstractLine(_CompositeBaseObject, metaclass=ABCMeta):
     def destroy(self):
         super().destroy()
         for slider in self.sliders.copy():
-            slider.destroy()
-
-    def find_closest_point(self, coords):
-        # check first if already in line
-        if self._which_segment(coords) is not None:
-            return coords
-
-        line_coords = self.canvas_coords
-
-        pt = np.array(coords)
-        dist = np.linalg.norm(line_coords - pt, axis=1)
-
-        closest_idx = np.argmin(dist)
-        n_pts = line_coords.shape[0]
-
-        closest_pt = line_coords[closest_idx, :]
-
-        pt_left = line_coords[closest_idx - 1, :] if closest_idx > 0 else np.nan
-        pt_right = line_coords[closest_idx + 1, :] if closest_idx < n_pts - 1 else np.nan
-
-        direcs = [pt_left - closest_pt, pt_right - closest_pt]
-        direcs = [direc / np.linalg.norm(direc) for direc in direcs]
-        vec = pt - closest_pt
-
-        par_projs = []
-        for direc in direcs:
-            scalar = np.dot(vec, direc)
-            if scalar > 0:
-                par_projs.append(scalar * direc)
+            if slider.id in self.canvas.objects:
+                self.canvas.delete_object(slider.id)
             else:
-                par_projs.append(np.inf)
-        perp_projs = [vec - par_proj for par_proj in par_projs]
-
-        par_projs.append(np.zeros(2))
-        perp_projs.append(vec)
-
-        closest_idx = np.argmin(np.linalg.norm(perp_projs, axis=1))
-
-        return closest_pt + par_projs[closest_idx]
+                slider.destroy()
 
     def update_coords(self):
-        new_coords = [point.canvas_coords for point in self.points]
-        self.canvas.coords(self.id, flatten_list(new_coords))
+        self._redraw()
 
         for slider in self.sliders:
             slider.update_master_pts()
 
-        return new_coords
-
-    def get_coords_by_v(self, v):
-        vlims = self._get_vlims()
-        for seg_index, (vlim1, vlim2) in enumerate(vlims):
-            if v >= vlim1 and v <= vlim2:
-                break
-        s = (v - vlim1) / (vlim2 - vlim1)
-        pt1 = self.points[seg_index].canvas_coords
-        pt2 = self.points[seg_index + 1].canvas_coords
-
-        return pt1 + s * (pt2 - pt1)
-
-    def get_v(self, coords):
-        # stepwise-linear curve independent variable
-        seg_index = self._which_segment(coords)
-        s = self.get_s(seg_index, coords)
-        vlims = self._get_vlims()[seg_index]
-
-        return vlims[0] + s * (vlims[1] - vlims[0])
-
-    def _get_vlims(self):
-        points = self.canvas_coords
-        t_vecs = []
-        for pt1, pt2 in zip(points, points[1::]):
-            t_vecs.append(pt2 - pt1)
-
-        ts = np.linalg.norm(np.array(t_vecs), axis=1)
-        ts = np.cumsum(ts / np.sum(ts))
-        ts = [0.] + list(ts)
-
-        return [(t0, t1) for t0, t1 in zip(ts, ts[1::])]
-
-    def get_s(self, seg_index, coords):
-        # segment independent variable
-        pt1 = self.points[seg_index].canvas_coords
-        pt2 = self.points[seg_index + 1].canvas_coords
-        t_vec = pt2 - pt1
-
-        # TODO: when both are 0 (it should not be possible - overlap)
-        i = 1 if abs(t_vec[0]) < ATOL else 0
-
-        return (coords[i] - pt1[i]) / t_vec[i]
-
-    def _which_segment(self, coords):
-        points = self.canvas_coords
-
-        for seg_index, (pt1, pt2) in enumerate(zip(points, points[1::])):
-            t_vec = pt2 - pt1
-            if abs(t_vec[0]) < ATOL:
-                i, j = 0, 1
-            else:
-                i, j = 1, 0
-
-            s = (coords[j] - pt1[j]) / t_vec[j]
-            z_cmp = pt1[i] + t_vec[i] * s
-            if 0 <= s <= 1 and abs(z_cmp - coords[i]) < ATOL:
-                return seg_index
+    def _draw(self):
+        view_coords = self.canvas.canvas2view(self.canvas_coords)
+        self.canvas.coords(self.id, view_coords.ravel().tolist())
 
     def add_slider(self, slider):
         self.sliders.append(slider)
@@ -1306,69 +1574,120 @@ class Line(_AbstractLine):
                  text='', allow_translate=True, allow_delete=True,
                  allow_edit=True):
 
-        points = [_LinePoint(self, coords_, color=color, size=small_size,
+        points = [_LinePoint(self, color=color, size=small_size,
                              allow_translate=allow_edit)
-                  for coords_ in coords]
-        points[0]._init_size = size
+                  for _ in coords]
+        points[0]._size = size
+        self._init_coords = coords
 
         super().__init__(name, points, width=width, color=color, text=text,
                          allow_translate=allow_translate,
                          allow_delete=allow_delete, allow_edit=allow_edit)
 
+    def _create_model(self):
+        self.model = self.canvas.document.add_line(self.name,
+                                                   self._init_coords)
+
     def _create_popup_menu(self):
         self.popup_menu = LinePopupMenu(self)
 
-    def add_point(self, coords, pos=None):
-        point = _LinePoint(self, self.canvas.map2real(coords), color=self.color,
-                           size=self.small_size, allow_translate=self.allow_translate)
-        point.create_widget(self.canvas)
+    def project(self, coords):
+        return self.model.project(coords)
 
-        if pos not in ['begin', 'end']:
-            seg_index = self._which_segment(point.canvas_coords)
-            self.points.insert(seg_index + 1, point)
+    def find_closest_point(self, coords):
+        return self.model.find_closest_point(coords)
 
-        elif pos == 'begin':
-            point.size = self.size
-            self.points.insert(0, point)
+    def get_coords_by_v(self, v):
+        return self.model.get_coords_by_v(v)
 
-        else:
-            self.points.append(point)
+    def get_v(self, coords):
+        return self.model.get_v(coords)
 
-        self.update_coords()
+    def add_point(self, coords, pos=None, index=None):
+        # index is found by projection if not given (nor pos)
+        self.canvas.begin_change(self)
+        point = _LinePoint(self, color=self.color, size=self.small_size,
+                           allow_translate=self.allow_translate)
+
+        if pos == 'begin':
+            index = 0
+            point._size = self.size
+
+        elif pos == 'end':
+            index = len(self.points)
+
+        elif index is None:
+            index = self.model.project(coords)[1] + 1
+
+        with self.canvas.batch():
+            self.model.insert_point(index, coords)
+            self.points.insert(index, point)
+            self._index_points()
+            point.create_widget(self.canvas)
+
+            self.update_coords()
 
     def remove_point(self, point):
         if len(self.points) < 3:
             return
 
+        self.canvas.begin_change(self)
         index = self.points.index(point)
 
-        self.points[index].destroy()
-        del self.points[index]
+        with self.canvas.batch():
+            self.points[index].destroy()
+            del self.points[index]
+            self.model.remove_point(index)
+            self._index_points()
 
-        if index == 0:
-            self.points[0].size = self.size
+            if index == 0:
+                self.points[0].size = self.size
 
-        self.update_coords()
+            self.update_coords()
+
+    def set_geometry(self, values):
+        # points are added or removed at the end if their number differs
+        n_points = len(values)
+        new_points = [_LinePoint(self, color=self.color, size=self.small_size,
+                                 allow_translate=self.allow_translate)
+                      for _ in range(n_points - len(self.points))]
+
+        with self.canvas.batch():
+            for point in self.points[n_points:]:
+                point.destroy()
+            del self.points[n_points:]
+
+            self.points.extend(new_points)
+            self.model.canvas_coords = values
+            self._index_points()
+            for point in new_points:
+                point.create_widget(self.canvas)
+
+            self.redraw()
 
 
 class Slider(_AbstractLine):
     type = 'Slider'
+    dependency_keys = {'anchor': 'Line'}
+    history_attributes = _AbstractLine.history_attributes + (
+        'v_init', 'v_end', 'n_points')
 
     def __init__(self, name, anchor, v_init, v_end, n_points, width=3,
                  size=5, small_size=4, color='green', text='', allow_delete=True,
                  allow_translate=True, allow_edit=True):
         self.anchor = anchor
         self.anchor.add_slider(self)
+        self._init_vs = v_init, v_end
 
-        self.master_pts = [_MasterSliderPoint(self, v_init, color=color,
-                                              size=size, allow_translate=allow_edit),
-                           _MasterSliderPoint(self, v_end, color=color,
+        self.master_pts = [_MasterSliderPoint(self, color=color, size=size,
+                                              allow_translate=allow_edit),
+                           _MasterSliderPoint(self, color=color,
                                               size=small_size,
                                               allow_translate=allow_edit)]
 
         points = [self.master_pts[0]]
-        for t in self._get_ts(n_points):
-            points.append(_SlaveSliderPoint(self, t, color=color,
+        for _ in range(n_points - 2):
+            points.append(_SlaveSliderPoint(self, color=color,
                                             size=small_size))
         points.append(self.master_pts[1])
 
@@ -1377,8 +1696,9 @@ class Slider(_AbstractLine):
                          allow_delete=allow_delete,
                          allow_translate=allow_translate, allow_edit=allow_edit)
 
-    def _get_ts(self, n_points):
-        return [(i + 1) / (n_points - 1) for i in range(n_points - 2)]
+    def _create_model(self):
+        self.model = self.canvas.document.add_slider(
+            self.name, self.anchor.model, *self._init_vs, len(self.points))
 
     @property
     def n_points(self):
@@ -1390,6 +1710,7 @@ class Slider(_AbstractLine):
             return
 
         previous_n = self.n_points
+        new_points = []
 
         if previous_n > n_points:  # delete points
             diff_n = previous_n - n_points
@@ -1398,37 +1719,39 @@ class Slider(_AbstractLine):
 
             del self.points[1:(1 + diff_n)]
 
-        # add missing points
-        ts = self._get_ts(n_points)
-        if len(ts) > previous_n - 2:
-            for t in ts[previous_n - 2:]:
-                new_point = _SlaveSliderPoint(self, t, color=self.color,
+        else:  # add missing points
+            for _ in range(n_points - previous_n):
+                new_point = _SlaveSliderPoint(self, color=self.color,
                                               size=self.small_size)
-                new_point.create_widget(self.canvas)
                 self.points.insert(-1, new_point)
+                new_points.append(new_point)
 
-        # update points t
-        if len(ts) > 0:
-            for point, t in zip(self.points[1:-1], ts):
-                point.t = t
-        else:
-            self.update_coords()  # guarantees update of line coords
+        with self.canvas.batch():
+            self.model.n_points = n_points
+            self._index_points()
+            for new_point in new_points:
+                new_point.create_widget(self.canvas)
+
+            self.update_coords()
 
     @property
     def v_init(self):
-        return self.master_pts[0].v
+        return self.model.v_init
 
     @v_init.setter
     def v_init(self, value):
-        self.master_pts[0].canvas_coords = self.anchor.get_coords_by_v(value)
+        # kept as is (projecting its coordinates may give another v)
+        self.model.v_init = value
+        self.update_coords()
 
     @property
     def v_end(self):
-        return self.master_pts[1].v
+        return self.model.v_end
 
     @v_end.setter
     def v_end(self, value):
-        self.master_pts[1].canvas_coords = self.anchor.get_coords_by_v(value)
+        self.model.v_end = value
+        self.update_coords()
 
     @_AbstractLine.allow_translate.setter
     def allow_translate(self, value):
@@ -1443,26 +1766,33 @@ class Slider(_AbstractLine):
     def _get_direc(self):
         return self.master_pts[1] - self.master_pts[0]
 
+    def get_geometry(self):
+        # follows the anchor and v_init, v_end
+        return None
+
     def update_coords(self):
-        new_coords = super().update_coords()
+        # slaves follow the model, redrawn together with the slider
+        with self.canvas.batch():
+            super().update_coords()
 
-        # also update slaves
-        for point, new_coords_ in zip(self.points[1:-1], new_coords[1:-1]):
-            point.canvas_coords = new_coords_
+            for point in self.points:
+                point._redraw()
 
     def update_master_pts(self):
-        for pt in self.master_pts:
-            pt.update_coords()
+        # v is kept when the anchor changes
+        self.update_coords()
 
     def destroy(self):
         super().destroy()
         self.anchor.remove_slider(self)
 
     def on_config_delta_mov(self, event):
-        self.anchor._click_mouse_coords = event.x, event.y
+        self.canvas.flush_motions()
+        self.anchor._click_mouse_coords = self.canvas.get_event_coords(event)
         self.anchor._click_coords = self.anchor.canvas_coords
 
     def on_translate(self, event):
+        self.canvas.begin_change(self.anchor)
         self.anchor.canvas_coords = self.anchor._click_coords + self.anchor._get_delta_mov(event)
 
     def show(self, from_anchor=False):
@@ -1481,19 +1811,20 @@ class Slider(_AbstractLine):
                color=None, width=None, size=None, small_size=None, text=None,
                allow_translate=None, allow_delete=None, allow_edit=None,
                **kwargs):
-        super().update(name=name, coords=None, color=color, width=width,
-                       size=size, small_size=small_size, text=text,
-                       allow_translate=allow_translate, allow_delete=allow_delete,
-                       allow_edit=allow_edit)
+        with self.canvas.batch():
+            super().update(name=name, coords=None, color=color, width=width,
+                           size=size, small_size=small_size, text=text,
+                           allow_translate=allow_translate,
+                           allow_delete=allow_delete, allow_edit=allow_edit)
 
-        if v_init is not None:
-            self.v_init = v_init
+            if v_init is not None:
+                self.v_init = v_init
 
-        if v_end is not None:
-            self.v_end = v_end
+            if v_end is not None:
+                self.v_end = v_end
 
-        if n_points is not None:
-            self.n_points = n_points
+            if n_points is not None:
+                self.n_points = n_points
 
     def as_dict(self):
         data = super().as_dict()
@@ -3,6 +3,7 @@ from abc import ABCMeta
 from abc import abstractmethod
 import tkinter as tk
 
+from neverd.constants import RIGHT_BUTTON
 from neverd.forms import OBJ2FORM
 from neverd.forms import PointForm
 from neverd.forms import LineForm
@@ -27,10 +28,10 @@ class _BasePopupMenu(tk.Menu, metaclass=ABCMeta):
         return []
 
     def unbind_menu_trigger(self):
-        self.master.unbind('<Button-2>')
+        self.master.unbind(f'<Button-{RIGHT_BUTTON}>')
 
     def bind_menu_trigger(self):
-        self.master.bind('<Button-2>',
+        self.master.bind(f'<Button-{RIGHT_BUTTON}>',
                          self.on_popup_menu_trigger)
 
     def on_popup_menu_trigger(self, event):
@@ -159,10 +160,10 @@ class ObjectPopupMenu(_BasePopupMenu):
         return ['Show/hide', 'Edit', 'View properties', 'Delete']
 
     def _unbind_obj_menu_trigger(self, obj):
-        self.object.canvas.tag_unbind(obj.id, '<Button-2>')
+        self.object.canvas.tag_unbind(obj.id, f'<Button-{RIGHT_BUTTON}>')
 
     def _bind_obj_menu_trigger(self, obj):
-        self.object.canvas.tag_bind(obj.id, '<Button-2>',
+        self.object.canvas.tag_bind(obj.id, f'<Button-{RIGHT_BUTTON}>',
                                     self.on_popup_menu_trigger, add='+')
 
     def unbind_menu_trigger(self):
@@ -261,7 +262,7 @@ class LinePopupMenu(ObjectPopupMenu):
         return order
 
     def _bind_store_click_position(self):
-        self.object.canvas.tag_bind(self.object.id, '<Button-2>',
+        self.object.canvas.tag_bind(self.object.id, f'<Button-{RIGHT_BUTTON}>',
                                     self.on_store_click_position, add='+')
 
     def _bind_trigger(self, obj):
@@ -312,14 +313,15 @@ class LinePopupMenu(ObjectPopupMenu):
 
     def on_add_point(self):
         coords = (self._x_click, self._y_click)
-        new_coords = self.object.find_closest_point(coords)
-        self.object.add_point(new_coords)
+        new_coords, seg_index, _ = self.object.project(coords)
+        self.object.add_point(new_coords, index=seg_index + 1)
 
     def on_refine(self):
         coords = self.object.canvas_coords
-        for coords1, coords2 in zip(coords, coords[1::]):
-            new_coords = (coords2 + coords1) / 2
-            self.object.add_point(new_coords)
+        with self.object.canvas.batch():
+            for coords1, coords2 in zip(coords, coords[1::]):
+                new_coords = (coords2 + coords1) / 2
+                self.object.add_point(new_coords)
 
     def on_remove_point(self, point):
         self.object.remove_point(point)
@@ -327,8 +329,7 @@ class LinePopupMenu(ObjectPopupMenu):
         self._bind_add_point()
 
     def on_store_click_position(self, event):
-        self._x_click = event.x
-        self._y_click = event.y
+        self._x_click, self._y_click = self.object.canvas.get_event_coords(event)
 
 
 class SliderPopupMenu(ObjectPopupMenu):
@@ -347,9 +348,11 @@ class SliderPopupMenu(ObjectPopupMenu):
         self._unbind_item('Coarse')
 
     def on_refine(self):
+        self.object.canvas.begin_change(self.object)
         self.object.n_points = self.object.n_points + 1
 
     def on_coarse(self):
+        self.object.canvas.begin_change(self.object)
         self.object.n_points = self.object.n_points - 1
 
 
@@ -360,10 +363,10 @@ class ImagePopupMenu(ObjectPopupMenu):
         super().on_popup_menu_trigger(event)
 
     def _unbind_obj_menu_trigger(self, obj):
-        self.object.canvas.tag_unbind(obj.id, '<Control-2>')
+        self.object.canvas.tag_unbind(obj.id, f'<Control-{RIGHT_BUTTON}>')
 
     def _bind_obj_menu_trigger(self, obj):
-        self.object.canvas.tag_bind(obj.id, '<Control-2>',
+        self.object.canvas.tag_bind(obj.id, f'<Control-{RIGHT_BUTTON}>',
                                     self.on_popup_menu_trigger)
 
     def on_delete(self, *args):
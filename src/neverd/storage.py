@@ -0,0 +1,149 @@
+import json
+import os
+
+import numpy as np
+
+
+# values stored as raw float arrays in binary files
+ARRAY_KEYS = ('coords', 'canvas_coords')
+
+
+def is_binary(filename):
+    return os.path.splitext(filename)[1].lower() == '.npz'
+
+
+def dump_data(data, filename):
+    # format picked by extension (.npz or json)
+    if is_binary(filename):
+        dump_npz(data, filename)
+    else:
+        with open(filename, 'w') as file:
+            json.dump(data, file, indent=2)
+
+
+def load_data(filename, replay=False):
+    # with replay, unsaved changes journaled after the file was written are
+    # applied (crash recovery, see neverd.journal)
+    if is_binary(filename):
+        data = load_npz(filename)
+    else:
+        with open(filename, 'r') as file:
+            data = json.load(file)
+
+    if replay:
+        data = replay_journal(data, read_journal(filename))
+
+    return data
+
+
+def dump_npz(data, filename):
+    # json header where coordinates are replaced by [start, shape] references
+    # to a single float array
+    arrays = []
+    header = _pack(data, arrays, [0])
+    coords = np.concatenate(arrays) if arrays else np.empty(0)
+
+    header = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+    with open(filename, 'wb') as file:  # avoids numpy appending .npz
+        np.savez(file, header=header, coords=coords)
+
+
+def load_npz(filename):
+    with np.load(filename) as npz_file:
+        header = json.loads(npz_file['header'].tobytes().decode('utf-8'))
+        coords = npz_file['coords']
+
+    return _unpack(header, coords)
+
+
+def _pack(data, arrays, offset):
+    if isinstance(data, dict):
+        packed = {}
+        for key, value in data.items():
+            if key in ARRAY_KEYS and value is not None:
+                value = np.asarray(value, dtype=float)
+                arrays.append(value.ravel())
+                packed[key] = {'__array__': [offset[0], list(value.shape)]}
+                offset[0] += value.size
+            else:
+                packed[key] = _pack(value, arrays, offset)
+
+        return packed
+
+    if isinstance(data, (list, tuple)):
+        return [_pack(value, arrays, offset) for value in data]
+
+    return data
+
+
+def _unpack(data, coords):
+    if isinstance(data, dict):
+        if '__array__' in data:
+            start, shape = data['__array__']
+            size = int(np.prod(shape))
+            return coords[start:start + size].reshape(shape)
+
+        return {key: _unpack(value, coords) for key, value in data.items()}
+
+    if isinstance(data, list):
+        return [_unpack(value, coords) for value in data]
+
+    return data
+
+
+def get_journal_filename(filename):
+    return f'{filename}.journal'
+
+
+def read_journal(filename):
+    # entries of the journal of a project file (empty if there is none)
+    # an incomplete last line (e.g. after a crash) is ignored
+    journal_filename = get_journal_filename(filename)
+    if not os.path.exists(journal_filename):
+        return []
+
+    entries = []
+    with open(journal_filename, 'r') as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+
+    return entries
+
+
+def has_journal(filename):
+    return len(read_journal(filename)) > 0
+
+
+def replay_journal(data, entries):
+    # objects are identified by their name in the project file (or when they
+    # were first journaled, see Journal); a snapshot replaces all the data
+    objects = _get_objects_by_name(data)
+
+    for entry in entries:
+        if entry['op'] == 'snapshot':
+            data = dict(entry['data'])
+            objects = _get_objects_by_name(data)
+            continue
+
+        if 'object' in entry:
+            target, key = objects, entry['object']
+        else:  # calibration or image
+            target, key = data, entry['key']
+
+        if entry['op'] == 'set':
+            target[key] = entry['data']
+        else:
+            target.pop(key, None)
+
+    if objects or 'objects' in data:
+        data['objects'] = list(objects.values())
+
+    return data
+
+
+def _get_objects_by_name(data):
+    return {obj_info['name']: obj_info
+            for obj_info in data.get('objects', [])}
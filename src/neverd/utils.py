@@ -53,8 +53,8 @@ def disable_children(parent):
         disable_children(child)
 
 
-def get_bound_position(canvas, widget_id, x, y, tol=2):
-    coords = canvas.bbox(widget_id)
+def get_bound_position(canvas, widget_id, x, y, tol=2, bbox=None):
+    coords = canvas.bbox(widget_id) if bbox is None else bbox
     if coords is None:
         return None
 
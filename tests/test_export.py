@@ -0,0 +1,97 @@
+import csv
+
+import numpy as np
+import pytest
+
+from neverd.export import export_data
+from neverd.export import export_file
+from neverd.export import get_export_table
+from neverd.export import get_output_filename
+from neverd.export import get_project_filenames
+from neverd.export import iter_export_files
+from neverd.model import load_document
+from neverd.storage import dump_data
+
+
+DATA = {
+    'calibration': {'canvas_coords': [[20., 20.], [780., 580.]],
+                    'coords': [[-10., 10.], [10., -10.]]},
+    'objects': [
+        {'type': 'Line', 'name': 'l', 'coords': [[0., 0.], [4., 0.]]},
+        {'type': 'Slider', 'name': 's', 'anchor': 'l', 'v_init': 0.,
+         'v_end': 1., 'n_points': 3},
+        {'type': 'Point', 'name': 'p,"1"', 'coords': [1., 2.]},
+    ],
+}
+
+
+def _get_data():
+    return {'calibration': dict(DATA['calibration']),
+            'objects': [dict(obj_info) for obj_info in DATA['objects']]}
+
+
+def test_get_export_table():
+    table = get_export_table(load_document(_get_data()))
+
+    assert table['name'].tolist() == ['l'] * 2 + ['s'] * 3 + ['p,"1"']
+    assert table['type'].tolist() == ['Line'] * 2 + ['Slider'] * 3 + ['Point']
+    assert table['index'].tolist() == [0, 1, 0, 1, 2, 0]
+    np.testing.assert_allclose(table['x'], [0, 4, 0, 2, 4, 1], atol=1e-12)
+    np.testing.assert_allclose(table['y'], [0, 0, 0, 0, 0, 2], atol=1e-12)
+
+
+def test_get_export_table_empty():
+    assert len(get_export_table(load_document({}))) == 0
+
+
+def test_export_csv(tmp_path):
+    output = str(tmp_path / 'points.csv')
+    assert export_data(_get_data(), output, n_points=5) == 8
+
+    with open(output, newline='') as file:
+        rows = list(csv.reader(file))
+
+    assert rows[0] == ['name', 'type', 'index', 'x', 'y']
+    assert rows[-1][:3] == ['p,"1"', 'Point', '0']
+    assert [float(value) for value in rows[-1][3:]] == pytest.approx([1, 2])
+
+
+def test_export_npy(tmp_path):
+    filename = str(tmp_path / 'project.npz')
+    dump_data(_get_data(), filename)
+
+    output = str(tmp_path / 'points.npy')
+    assert export_file(filename, output) == 6
+
+    table = np.load(output)
+    assert table.dtype.names == ('name', 'type', 'index', 'x', 'y')
+    assert len(table) == 6
+
+
+def test_get_output_filename():
+    assert get_output_filename('a/b.json') == 'a/b.csv'
+    assert get_output_filename('a/b.npz', 'out', '.npy') == 'out/b.npy'
+
+
+def test_get_project_filenames(tmp_path):
+    for name in ('b.json', 'a.json', 'a.npz', 'c.txt'):
+        (tmp_path / name).touch()
+
+    paths = [str(tmp_path), str(tmp_path / 'd.json')]  # files are kept
+    filenames = get_project_filenames(paths)
+    assert filenames == [str(tmp_path / name) for name in
+                         ('a.json', 'b.json', 'a.npz', 'd.json')]
+
+
+def test_iter_export_files(tmp_path):
+    filenames = [str(tmp_path / name)
+                 for name in ('a.json', 'a.npz', 'b.json')]
+    for filename in filenames[:2]:
+        dump_data(_get_data(), filename)
+
+    results = list(iter_export_files(filenames, n_jobs=1))
+
+    assert [result[0] for result in results] == filenames
+    assert results[0][2:] == (6, None)
+    assert 'also the output of' in results[1][3]  # same a.csv
+    assert results[2][2] == 0 and results[2][3] is not None  # missing
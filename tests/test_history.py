@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+from neverd.history import History
+from neverd.history import _apply_geometry_delta
+from neverd.history import _get_geometry_delta
+
+
+class _Canvas:
+    # what History needs from GeometricCanvas (no display)
+    calibration_rectangle = None
+    image = None
+
+    def __init__(self):
+        self.objects = {}  # name -> object
+        self.history = None
+
+    def after_idle(self, func):
+        return 'job'  # committed explicitly
+
+    def after_cancel(self, job):
+        pass
+
+    def get_by_name(self, name):
+        return self.objects.get(name, None)
+
+    def begin_change(self, obj):
+        self.history.record_change(obj)
+
+    @contextmanager
+    def batch(self):
+        yield
+
+
+class _Object:
+    history_attributes = ('name', 'color')
+
+    def __init__(self, canvas, name, coords, color='red'):
+        self.canvas = canvas
+        self.name = name
+        self.color = color
+        self.coords = np.array(coords, dtype=float)
+        canvas.objects[name] = self
+
+    def get_geometry(self):
+        return self.coords.copy()
+
+    def set_geometry(self, geometry):
+        self.coords = np.array(geometry)
+
+    def update(self, name=None, color=None):
+        self.canvas.begin_change(self)
+        if name is not None:
+            del self.canvas.objects[self.name]
+            self.name = name
+            self.canvas.objects[name] = self
+
+        if color is not None:
+            self.color = color
+
+    def move(self, coords):
+        self.canvas.begin_change(self)
+        self.coords = np.array(coords, dtype=float)
+
+
+def _get_history(max_bytes=64 * 2**20):
+    canvas = _Canvas()
+    history = canvas.history = History(canvas, max_bytes=max_bytes)
+    obj = _Object(canvas, 'l', np.zeros((100, 2)))
+
+    return history, obj
+
+
+def test_geometry_delta():
+    geometry = np.zeros((4, 2))
+
+    moved = geometry.copy()
+    moved[2] = [1., 3.]
+    delta = _get_geometry_delta(geometry, moved)
+    assert delta[0] == 'points' and delta[1].tolist() == [2]
+
+    translated = geometry + [2., 1.]
+    assert _get_geometry_delta(geometry, translated)[0] == 'translate'
+
+    assert _get_geometry_delta(geometry, geometry.copy()) is None
+    assert _get_geometry_delta(geometry, np.zeros((5, 2)))[0] == 'replace'
+
+    for new_geometry in (moved, translated):
+        delta = _get_geometry_delta(geometry, new_geometry)
+        np.testing.assert_allclose(
+            _apply_geometry_delta(new_geometry.copy(), delta, undo=True),
+            geometry)
+        np.testing.assert_allclose(
+            _apply_geometry_delta(geometry.copy(), delta, undo=False),
+            new_geometry)
+
+
+def test_undo_redo():
+    history, obj = _get_history()
+
+    coords = obj.get_geometry()
+    coords[10] = [5., 5.]
+    obj.move(coords)
+    obj.update(name='l2', color='blue')  # same entry
+    history.commit()
+
+    assert len(history._undo) == 1
+    assert history._undo[0].n_bytes < obj.coords.nbytes
+
+    history.undo()
+    assert (obj.name, obj.color) == ('l', 'red')
+    assert np.all(obj.coords == 0.)
+
+    history.redo()
+    assert (obj.name, obj.color) == ('l2', 'blue')
+    np.testing.assert_allclose(obj.coords, coords)
+
+
+def test_hold():
+    history, obj = _get_history()
+
+    history.hold()
+    for i in range(3):
+        obj.move(obj.coords + 1.)
+        history._on_idle()
+    history.release()
+
+    assert len(history._undo) == 1
+    assert history._undo[0].changes[0].geometry[0] == 'translate'
+
+
+def test_new_change_drops_redo():
+    history, obj = _get_history()
+    for color in ('blue', 'green'):
+        obj.update(color=color)
+        history.commit()
+
+    history.undo()
+    history.undo()
+    obj.update(color='black')
+    history.commit()
+
+    assert history._redo == []
+    assert history._n_bytes == sum(entry.n_bytes for entry in history._undo)
+
+
+def test_max_bytes():
+    history, obj = _get_history(max_bytes=1)
+    for i in range(3):
+        obj.move(obj.coords + np.arange(200).reshape(-1, 2))
+        history.commit()
+
+    assert len(history._undo) == 1
+    assert history._n_bytes == history._undo[0].n_bytes
@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+
+from neverd.model import Document
+from neverd.model import PointStore
+from neverd.model import load_document
+from neverd.model import sort_objects_info
+from neverd.model import TYPE2MODEL
+
+
+CALIBRATION = {'canvas_coords': [[20, 20], [780, 580]],
+               'coords': [[-10, 10], [10, -10]]}
+
+
+def _get_document():
+    document = Document()
+    document.calibrate(CALIBRATION['canvas_coords'], CALIBRATION['coords'])
+
+    return document
+
+
+def test_calibration_maps():
+    document = _get_document()
+
+    np.testing.assert_allclose(document.map2canvas([-10, 10]), [20, 20])
+    np.testing.assert_allclose(document.map2canvas([0, 0]), [400, 300])
+
+    coords = np.array([[1.5, -2.], [3., 4.]])
+    np.testing.assert_allclose(document.map2real(document.map2canvas(coords)),
+                               coords)
+
+
+def test_add_before_calibration():
+    with pytest.raises(Exception):
+        Document().add_point('p', [0, 0])
+
+
+def test_line_project():
+    line = _get_document().add_line('l', [[0, 0], [5, 0], [10, 0]])
+
+    closest, seg_index, v = line.project(line.canvas_coords[1])
+    np.testing.assert_allclose(closest, line.canvas_coords[1])
+    assert v == pytest.approx(0.5)
+
+    np.testing.assert_allclose(line.get_coords_by_v([0., 0.5, 1.]),
+                               line.canvas_coords)
+
+
+def test_slider_follows_anchor():
+    document = _get_document()
+    line = document.add_line('l', [[0, 0], [8, 0]])
+    slider = document.add_slider('s', line, 0.25, 0.75, 3)
+
+    np.testing.assert_allclose(slider.coords, [[2, 0], [4, 0], [6, 0]],
+                               atol=1e-12)
+
+    line.translate(document.map2canvas([0, 1]) - document.map2canvas([0, 0]))
+    np.testing.assert_allclose(slider.coords, [[2, 1], [4, 1], [6, 1]],
+                               atol=1e-12)
+
+    slider.n_points = 5
+    assert slider.coords.shape == (5, 2)
+
+    document.remove(slider)
+    assert line.sliders == []
+
+
+def test_keep_real():
+    document = _get_document()
+    point = document.add_point('p', [1, 2])
+    line = document.add_line('l', [[0, 0], [4, 4]])
+    slider = document.add_slider('s', line, 0., 1., 3)
+
+    document.set_calibration([[0, 0], [800, 600]], CALIBRATION['coords'],
+                             keep_real=True)
+
+    np.testing.assert_allclose(point.coords, [1, 2])
+    np.testing.assert_allclose(line.coords, [[0, 0], [4, 4]], atol=1e-12)
+    np.testing.assert_allclose(slider.coords, [[0, 0], [2, 2], [4, 4]],
+                               atol=1e-12)
+
+
+def test_point_store_compact():
+    store = PointStore(capacity=4)
+    blocks = [store.allocate(2000) for _ in range(3)]
+    for i, block in enumerate(blocks):
+        store.view(block)[:] = i
+
+    store.release(blocks[0])
+    store.release(blocks[1])
+
+    assert len(store.data) == 2000
+    assert np.all(store.view(blocks[2]) == 2)
+
+
+def test_load_document():
+    data = {'calibration': CALIBRATION,
+            'objects': [
+                {'type': 'Slider', 'name': 's', 'anchor': 'l', 'v_init': 0.,
+                 'v_end': 1., 'n_points': 3},
+                {'type': 'Line', 'name': 'l', 'coords': [[0, 0], [2, 2]]},
+                {'type': 'Point', 'name': 'p', 'coords': [1, 2]},
+                {'type': 'Unknown', 'name': 'u'},
+            ]}
+
+    document = load_document(data)
+
+    models = list(document.objects)
+    assert [model.name for model in models] == ['l', 's', 'p']
+    np.testing.assert_allclose(models[1].coords,
+                               [[0, 0], [1, 1], [2, 2]], atol=1e-12)
+
+
+def test_load_document_without_calibration():
+    assert len(load_document({}).objects) == 0
+
+
+def test_sort_objects_info():
+    objects_info = [
+        {'type': 'Point', 'name': 'p'},
+        {'type': 'Slider', 'name': 's1', 'anchor': 'l'},
+        {'type': 'Line', 'name': 'l'},
+        {'type': 'Slider', 'name': 's2', 'anchor': 'l'},
+    ]
+
+    sorted_info = sort_objects_info(objects_info, TYPE2MODEL)
+    assert [info['name'] for info in sorted_info] == ['p', 'l', 's1', 's2']
+
+
+@pytest.mark.parametrize('objects_info,message', [
+    ([{'type': 'Point', 'name': 'a'}, {'type': 'Line', 'name': 'a'}],
+     'Name already exists'),
+    ([{'type': 'Slider', 'name': 's', 'anchor': 'l'}],
+     'Unknown dependency'),
+    ([{'type': 'Point', 'name': 'p'},
+      {'type': 'Slider', 'name': 's', 'anchor': 'p'}],
+     'is not a Line'),
+])
+def test_sort_objects_info_errors(objects_info, message):
+    with pytest.raises(Exception, match=message):
+        sort_objects_info(objects_info, TYPE2MODEL)
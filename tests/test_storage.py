@@ -0,0 +1,106 @@
+import json
+
+import numpy as np
+
+from neverd.storage import dump_data
+from neverd.storage import get_journal_filename
+from neverd.storage import has_journal
+from neverd.storage import load_data
+from neverd.storage import read_journal
+from neverd.storage import replay_journal
+
+
+DATA = {
+    'metadata': {'width': 800, 'height': 600},
+    'calibration': {'canvas_coords': [[20., 20.], [780., 580.]],
+                    'coords': [[-10., 10.], [10., -10.]]},
+    'objects': [
+        {'type': 'Line', 'name': 'l',
+         'coords': [[0., 0.], [1.5, 2.], [3., 1.]], 'color': 'red'},
+        {'type': 'Slider', 'name': 's', 'anchor': 'l', 'v_init': 0.1,
+         'v_end': 0.9, 'n_points': 4, 'coords': None},
+        {'type': 'Point', 'name': 'p', 'coords': [1., 2.]},
+    ],
+}
+
+
+def _as_lists(data):
+    return json.loads(json.dumps(data, default=lambda array: array.tolist()))
+
+
+def _write_journal(filename, entries):
+    with open(get_journal_filename(filename), 'w') as file:
+        for entry in entries:
+            file.write(json.dumps(entry) + '\n')
+
+
+def test_json_round_trip(tmp_path):
+    filename = str(tmp_path / 'project.json')
+    dump_data(DATA, filename)
+
+    assert load_data(filename) == DATA
+
+
+def test_npz_round_trip(tmp_path):
+    filename = str(tmp_path / 'project.npz')
+    dump_data(DATA, filename)
+
+    data = load_data(filename)
+
+    assert isinstance(data['objects'][0]['coords'], np.ndarray)
+    assert _as_lists(data) == DATA
+
+
+def test_read_journal_incomplete_line(tmp_path):
+    filename = str(tmp_path / 'project.json')
+    assert read_journal(filename) == []
+    assert not has_journal(filename)
+
+    entry = {'op': 'delete', 'object': 'p'}
+    with open(get_journal_filename(filename), 'w') as file:
+        file.write(json.dumps(entry) + '\n{"op": "se')
+
+    assert read_journal(filename) == [entry]
+    assert has_journal(filename)
+
+
+def test_replay_journal():
+    point = {'type': 'Point', 'name': 'p', 'coords': [5., 5.]}
+    renamed_line = dict(DATA['objects'][0], name='l2')
+    new_point = {'type': 'Point', 'name': 'q', 'coords': [0., 1.]}
+    entries = [
+        {'op': 'set', 'object': 'p', 'data': point},
+        {'op': 'set', 'object': 'l', 'data': renamed_line},
+        {'op': 'set', 'object': 'q', 'data': new_point},
+        {'op': 'delete', 'object': 's'},
+        {'op': 'delete', 'key': 'calibration'},
+    ]
+
+    data = replay_journal(_as_lists(DATA), entries)
+
+    assert 'calibration' not in data
+    assert data['objects'] == [renamed_line, point, new_point]
+
+
+def test_replay_journal_snapshot():
+    snapshot = {'metadata': {'width': 10, 'height': 10}, 'objects': []}
+    entries = [
+        {'op': 'delete', 'object': 'p'},
+        {'op': 'snapshot', 'data': snapshot},
+        {'op': 'set', 'key': 'calibration', 'data': DATA['calibration']},
+    ]
+
+    data = replay_journal(_as_lists(DATA), entries)
+
+    assert data == dict(snapshot, calibration=DATA['calibration'])
+
+
+def test_load_data_replay(tmp_path):
+    filename = str(tmp_path / 'project.npz')
+    dump_data(DATA, filename)
+    _write_journal(filename, [{'op': 'delete', 'object': 'p'}])
+
+    assert len(load_data(filename)['objects']) == 3
+
+    data = load_data(filename, replay=True)
+    assert [obj['name'] for obj in data['objects']] == ['l', 's']